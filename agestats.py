@@ -0,0 +1,132 @@
+import os
+import json
+import threading
+from collections import deque
+from config import CONFIG
+
+MAX_AGE = 100
+MIN_PREDICTIONS = 5  # Predictions needed before a median is reported
+
+class AgeHistogram:
+    """Windowed age counts with an O(MAX_AGE) median, no sorting"""
+
+    def __init__(self, window):
+        self.recent = deque(maxlen=window)
+        self.counts = [0] * (MAX_AGE + 1)
+
+    def add(self, age):
+        age = min(max(int(age), 0), MAX_AGE)
+        if len(self.recent) == self.recent.maxlen:
+            self.counts[self.recent[0]] -= 1  # Oldest prediction leaves the window
+        self.recent.append(age)
+        self.counts[age] += 1
+
+    def median(self):
+        """Same element as sorted(predictions)[n // 2]"""
+        if len(self.recent) < MIN_PREDICTIONS:
+            return None
+        target = len(self.recent) // 2
+        seen = 0
+        for age, count in enumerate(self.counts):
+            seen += count
+            if seen > target:
+                return age
+        return None
+
+class AgeStatsStore:
+    """Median age per user in memory, persisted for all users in one file"""
+
+    def __init__(self, path=None, window=None, flush_interval=None):
+        self.path = path or CONFIG["age_stats_path"]
+        self.window = window or CONFIG["age_window"]
+        self.flush_interval = flush_interval or CONFIG["age_flush_interval"]
+        self.users = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                for name, ages in data.get("users", {}).items():
+                    histogram = self._histogram(name)
+                    for age in ages[-self.window:]:
+                        histogram.add(age)
+            except Exception as e:
+                print(f"Error loading age stats: {e}")
+        else:
+            self._migrate_age_dir()
+
+    def _migrate_age_dir(self):
+        """One-time import of the old per-user ages/<name>.json files"""
+        age_dir = CONFIG["age_dir"]
+        if not os.path.isdir(age_dir):
+            return
+        for age_file in os.listdir(age_dir):
+            if not age_file.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(age_dir, age_file), 'r') as f:
+                    predictions = json.load(f).get("predictions", [])
+                histogram = self._histogram(os.path.splitext(age_file)[0])
+                for age in predictions[-self.window:]:
+                    histogram.add(age)
+                self.dirty = True
+            except Exception as e:
+                print(f"Error migrating {age_file}: {e}")
+        self.flush()
+
+    def _histogram(self, name):
+        if name not in self.users:
+            self.users[name] = AgeHistogram(self.window)
+        return self.users[name]
+
+    def add(self, name, age):
+        with self.lock:
+            self._histogram(name).add(age)
+            self.dirty = True
+
+    def median(self, name):
+        with self.lock:
+            histogram = self.users.get(name)
+            return histogram.median() if histogram else None
+
+    def medians(self):
+        """Median age of every user with predictions"""
+        with self.lock:
+            medians = {name: h.median() for name, h in self.users.items()}
+        return {name: age for name, age in medians.items() if age is not None}
+
+    def flush(self):
+        """Write every user's window atomically if anything changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"users": {name: list(h.recent) for name, h in self.users.items()}}
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving age stats: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
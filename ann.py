@@ -0,0 +1,207 @@
+import os
+import json
+import numpy as np
+
+class IVFIndex:
+    """Inverted-file index over L2-normalized embeddings.
+
+    Vectors are clustered with spherical k-means and stored grouped by
+    cluster, so a query only scans the `nprobe` closest clusters. Adds go to
+    a small overflow set and built names are hidden behind a tombstone set
+    until the next build.
+    """
+
+    def __init__(self, centroids, vectors, names, offsets):
+        self.centroids = centroids
+        self.vectors = vectors  # Grouped by cluster, cluster k is rows offsets[k]:offsets[k + 1]
+        self.names = names
+        self.offsets = offsets
+        self.built = {str(n) for n in names}
+        self.removed = set()  # Built names hidden since the last build, always a subset of built
+        self.overflow = {}  # name -> vector added since the last build
+
+    @classmethod
+    def build(cls, names, vectors, nlist=None, iterations=10, seed=0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        count = len(vectors)
+        nlist = max(1, min(nlist or int(4 * np.sqrt(count)), count))
+        centroids = cls._kmeans(vectors, nlist, iterations, np.random.default_rng(seed))
+        assignment = cls._assign(vectors, centroids)
+
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+        return cls(centroids, vectors[order], np.asarray(names, dtype=str)[order], offsets)
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk=8192):
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            assignment[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return assignment
+
+    @classmethod
+    def _kmeans(cls, vectors, nlist, iterations, rng):
+        # Train on a sample; ~256 points per list is plenty for stable centroids
+        sample = vectors
+        if len(vectors) > 256 * nlist:
+            sample = vectors[rng.choice(len(vectors), 256 * nlist, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Reseed empty lists from random points
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1)
+        return centroids.astype(np.float32)
+
+    def save(self, prefix):
+        np.save(prefix + "_centroids.npy", self.centroids)
+        np.save(prefix + "_vectors.npy", np.ascontiguousarray(self.vectors))
+        np.save(prefix + "_names.npy", self.names)
+        np.save(prefix + "_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        """Load an index; with mmap the vectors stay on disk and are paged in on demand"""
+        mode = "r" if mmap else None
+        return cls(
+            np.load(prefix + "_centroids.npy"),
+            np.load(prefix + "_vectors.npy", mmap_mode=mode),
+            np.load(prefix + "_names.npy", mmap_mode=mode),
+            np.load(prefix + "_offsets.npy")
+        )
+
+    def __len__(self):
+        return len(self.vectors) - len(self.removed) + len(self.overflow)
+
+    def add(self, name, vector):
+        if name in self.built:
+            self.removed.add(name)  # Hide the older copy in the built lists
+        self.overflow[name] = np.asarray(vector, dtype=np.float32)
+
+    def remove(self, name):
+        if name in self.built:
+            self.removed.add(name)
+        self.overflow.pop(name, None)
+
+    def pending_changes(self):
+        """Distinct names added or removed since the build"""
+        return len(self.removed.union(self.overflow))
+
+    def search(self, queries, nprobe):
+        """Closest (name, cosine distance) for each normalized query row"""
+        queries = np.asarray(queries, dtype=np.float32)
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+
+        if self.overflow:
+            overflow_names = list(self.overflow)
+            overflow_vectors = np.stack([self.overflow[n] for n in overflow_names])
+
+        results = []
+        for query, lists in zip(queries, probes):
+            best_name, best_distance = None, None
+            rows = np.concatenate([np.arange(self.offsets[k], self.offsets[k + 1]) for k in lists])
+            if len(rows):
+                distances = 1.0 - self.vectors[rows] @ query
+                for i in np.argsort(distances):
+                    name = str(self.names[rows[i]])
+                    if name not in self.removed:
+                        best_name, best_distance = name, float(distances[i])
+                        break
+            if self.overflow:
+                distances = 1.0 - overflow_vectors @ query
+                i = int(np.argmin(distances))
+                if best_distance is None or distances[i] < best_distance:
+                    best_name, best_distance = overflow_names[i], float(distances[i])
+            results.append((best_name, best_distance))
+        return results
+
+class ShardedIndex:
+    """One IVF index per class/section so a camera only searches its own roster"""
+
+    def __init__(self, shards):
+        self.shards = shards  # section -> IVFIndex
+        self.section_of = {}
+        for section, index in shards.items():
+            for name in index.names:
+                self.section_of[str(name)] = section
+
+    @classmethod
+    def build(cls, names, vectors, sections, nlist=None):
+        """sections maps name -> section; names without one share the "" shard"""
+        groups = {}
+        for row, name in enumerate(names):
+            groups.setdefault(sections.get(name, ""), []).append(row)
+        shards = {}
+        for section, rows in groups.items():
+            shards[section] = IVFIndex.build([names[r] for r in rows], vectors[rows], nlist=nlist)
+        return cls(shards)
+
+    def save(self, directory, mtimes):
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        sections = list(self.shards)
+        for i, section in enumerate(sections):
+            self.shards[section].save(os.path.join(directory, f"shard_{i}"))
+        # Drop shards left over from a build with more sections
+        for file_name in os.listdir(directory):
+            parts = file_name.split("_")
+            if parts[0] == "shard" and len(parts) > 2 and parts[1].isdigit() and int(parts[1]) >= len(sections):
+                os.remove(os.path.join(directory, file_name))
+        # Meta last, so a half-written index is never picked up as current
+        with open(meta_path, "w") as f:
+            json.dump({"mtimes": mtimes, "sections": sections}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Returns (index, {name: image mtime} it was built from), or (None, None)"""
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        shards = {section: IVFIndex.load(os.path.join(directory, f"shard_{i}"), mmap=mmap)
+                  for i, section in enumerate(meta["sections"])}
+        return cls(shards), meta["mtimes"]
+
+    def __len__(self):
+        return sum(len(index) for index in self.shards.values())
+
+    def add(self, name, vector, section=""):
+        old = self.section_of.get(name)
+        if old is not None and old != section:
+            self.shards[old].remove(name)
+        if section not in self.shards:
+            self.shards[section] = IVFIndex.build([name], np.asarray([vector], dtype=np.float32))
+        else:
+            self.shards[section].add(name, vector)
+        self.section_of[name] = section
+
+    def remove(self, name):
+        section = self.section_of.pop(name, None)
+        if section is not None:
+            self.shards[section].remove(name)
+
+    def pending_changes(self):
+        """Adds and removals not yet folded into the built lists"""
+        return sum(index.pending_changes() for index in self.shards.values())
+
+    def search(self, queries, nprobe, sections=None):
+        """Best match per query across the selected shards (all shards if None)"""
+        selected = [s for s in (sections if sections is not None else self.shards) if s in self.shards]
+        best = [(None, None)] * len(queries)
+        for section in selected:
+            for i, (name, distance) in enumerate(self.shards[section].search(queries, nprobe)):
+                if name is not None and (best[i][1] is None or distance < best[i][1]):
+                    best[i] = (name, distance)
+        return best
@@ -0,0 +1,191 @@
+import os
+import csv
+import sqlite3
+import threading
+from datetime import datetime
+from config import CONFIG
+
+HEADER = ["Name", "Roll No", "Date", "Time", "Status"]
+
+def identity_key(name, roll_no, user_id=None, registry=None):
+    """Who an attendance row belongs to: the user ID, resolved through the registry
+    for rows written before user IDs existed, else (name, roll_no)"""
+    if user_id is None and registry is not None:
+        record = registry.by_name(name)
+        if record is not None and record["roll_no"] == roll_no:
+            user_id = record["user_id"]
+    return user_id or (name, roll_no)
+
+class AttendanceStore:
+    """SQLite attendance table indexed on (date, name, roll_no)"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or CONFIG["attendance_db"]
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS attendance (
+                name TEXT NOT NULL,
+                roll_no TEXT NOT NULL,
+                date TEXT NOT NULL,
+                time TEXT NOT NULL,
+                status TEXT NOT NULL,
+                camera TEXT,
+                user_id TEXT,
+                UNIQUE (date, name, roll_no)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(attendance)")}
+        if "camera" not in columns:
+            # Databases from before multi-camera support
+            self.conn.execute("ALTER TABLE attendance ADD COLUMN camera TEXT")
+        if "user_id" not in columns:
+            # Databases from before stable user IDs
+            self.conn.execute("ALTER TABLE attendance ADD COLUMN user_id TEXT")
+        self.conn.commit()
+
+    def add_many(self, rows):
+        """Insert [name, roll_no, date, time, status, camera, user_id] rows in one transaction"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO attendance (name, roll_no, date, time, status, camera, user_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
+    def present_on(self, date):
+        """Set of (name, roll_no, user_id) marked on a date, in a single indexed query"""
+        with self.lock:
+            cursor = self.conn.execute("SELECT name, roll_no, user_id FROM attendance WHERE date = ?", (date,))
+            return set(cursor.fetchall())
+
+    def migrate_csv(self, csv_path):
+        """Import an existing attendance.csv once. Returns the number of rows read"""
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'csv_migrated'").fetchone()
+        if done or not os.path.exists(csv_path):
+            return 0
+
+        rows = []
+        with open(csv_path, "r", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            for row in reader:
+                if len(row) >= 4:
+                    status = row[4].strip() if len(row) >= 5 else "Present"
+                    camera = (row[5].strip() or None) if len(row) >= 6 else None
+                    rows.append([row[0].strip(), row[1].strip(), row[2].strip(), row[3].strip(), status, camera])
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO attendance (name, roll_no, date, time, status, camera) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                              (datetime.now().isoformat(timespec="seconds"),))
+        return len(rows)
+
+    def export_csv(self, csv_path):
+        """Write the whole table out in the original attendance.csv layout.
+        The camera and user ID stay in the database"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, roll_no, date, time, status FROM attendance ORDER BY date, time").fetchall()
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            writer.writerows(rows)
+        os.replace(tmp_path, csv_path)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class AttendanceWriter:
+    """Marks each student once per day and stores new rows in batches"""
+
+    def __init__(self, path, flush_interval=None, store=None, registry=None):
+        self.path = path  # CSV kept in sync for compatibility
+        self.registry = registry
+        self.flush_interval = flush_interval or CONFIG["attendance_flush_interval"]
+        self.store = store or AttendanceStore()
+        self.store.migrate_csv(self.path)
+        self.marked = set()  # (identity_key, date) already recorded
+        self.loaded_dates = set()
+        self.pending = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self._load_date(datetime.now().strftime("%Y-%m-%d"))
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def _load_date(self, date):
+        """Seed the roster with rows already stored for a date"""
+        if date in self.loaded_dates:
+            return
+        try:
+            present = self.store.present_on(date)
+            with self.lock:
+                for name, roll_no, user_id in present:
+                    self.marked.add((identity_key(name, roll_no, user_id, self.registry), date))
+                self.loaded_dates.add(date)
+        except Exception as e:
+            print(f"Error reading attendance: {e}")
+
+    def mark(self, name, roll_no, when=None, camera=None, user_id=None):
+        """Queue a Present row at `when` (default now), credited to the camera that saw
+        the student first. Returns False if already marked that day"""
+        when = when or datetime.now()
+        date = when.strftime("%Y-%m-%d")
+        self._load_date(date)
+        name, roll_no = name.strip(), roll_no.strip()
+        key = (identity_key(name, roll_no, user_id, self.registry), date)
+        with self.lock:
+            if key in self.marked:
+                return False
+            self.marked.add(key)
+            self.pending.append([name, roll_no, date, when.strftime("%H:%M:%S"), "Present", camera, user_id])
+        return True
+
+    def mark_user(self, user_id, when=None, camera=None):
+        """Mark a registered user, taking name and roll number from the identity registry"""
+        record = self.registry.get(user_id) if self.registry is not None else None
+        if record is None:
+            return False
+        return self.mark(record["name"], record["roll_no"], when, camera, user_id)
+
+    def present_today(self):
+        """identity_key of everyone present today, including rows not yet flushed"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        with self.lock:
+            return {key for key, date in self.marked if date == today}
+
+    def flush(self):
+        """Commit pending rows in one transaction"""
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+        try:
+            self.store.add_many(rows)
+        except Exception as e:
+            print(f"Attendance logging error: {e}")
+            with self.lock:
+                self.pending = rows + self.pending
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        try:
+            self.store.export_csv(self.path)
+        except Exception as e:
+            print(f"Error exporting attendance: {e}")
+        self.store.close()
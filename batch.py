@@ -0,0 +1,178 @@
+"""Headless attendance over recorded lectures and snapshot folders.
+
+    python batch.py lecture.mp4 snapshots/ --workers 8
+"""
+import os
+import time
+import argparse
+import multiprocessing
+import cv2
+from datetime import datetime, timedelta
+from config import CONFIG
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".wmv")
+
+# Per-process state, filled once by _init_worker
+_detector = None
+_recognizer = None
+
+def _init_worker():
+    """Load the detector and recognizer once per worker process"""
+    global _detector, _recognizer
+    # One process per core already, so keep each process single-threaded
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    cv2.setNumThreads(1)
+
+    from detection import FaceDetection
+    from recognition import FaceRecognition
+    _detector = FaceDetection(store_ages=False)
+    # The parent process owns the registry; workers only read it
+    _recognizer = FaceRecognition(sync_gallery=False, read_only=True)
+
+def _recognize_frame(frame):
+    # Sampled frames are far apart, so don't carry ROI/propagation state between them
+    faces = _detector.detect_faces(frame, stateless=True)
+    if len(faces) == 0:
+        return []
+    face_imgs = [frame[y:y+h, x:x+w] for (x, y, w, h) in faces]
+    return [user_id for user_id in _recognizer.recognize_faces(face_imgs) if user_id != "Unknown"]
+
+def _note(sightings, user_id, when):
+    if user_id not in sightings or when < sightings[user_id]:
+        sightings[user_id] = when
+
+def process_video_segment(path, start, end, step, base_time):
+    """Recognize every `step`-th frame in [start, end). Returns {user_id: first seen}"""
+    sightings = {}
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for index in range(start, end):
+            if index % step:
+                # grab() skips the colour conversion of frames we don't analyse
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            when = base_time + timedelta(seconds=index / fps)
+            for user_id in _recognize_frame(frame):
+                _note(sightings, user_id, when)
+    finally:
+        cap.release()
+    return sightings
+
+def process_images(paths):
+    """Recognize a chunk of snapshots, timestamped by file modification time"""
+    sightings = {}
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        when = datetime.fromtimestamp(os.path.getmtime(path))
+        for user_id in _recognize_frame(frame):
+            _note(sightings, user_id, when)
+    return sightings
+
+def run_task(task):
+    kind, args = task
+    try:
+        if kind == "video":
+            return process_video_segment(*args)
+        return process_images(*args)
+    except Exception as e:
+        print(f"Batch task error ({kind}): {e}")
+        return {}
+
+def _video_tasks(path, step, start_time):
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    if frame_count <= 0:
+        print(f"Skipping video with unknown length {path}")
+        return []
+
+    # Without an explicit start, assume the file was last written when recording ended
+    base_time = start_time or (datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=frame_count / fps))
+    segment = CONFIG["batch_segment_frames"]
+    return [("video", (path, start, min(start + segment, frame_count), step, base_time))
+            for start in range(0, frame_count, segment)]
+
+def build_tasks(inputs, step, start_time=None):
+    """Split videos into frame segments and image folders into chunks"""
+    tasks, images = [], []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = [os.path.join(root, f) for root, _, files in os.walk(item) for f in sorted(files)]
+        else:
+            paths = [item]
+        for path in paths:
+            extension = os.path.splitext(path)[1].lower()
+            if extension in VIDEO_EXTENSIONS:
+                tasks.extend(_video_tasks(path, step, start_time))
+            elif extension in IMAGE_EXTENSIONS:
+                images.append(path)
+
+    chunk = CONFIG["batch_image_chunk"]
+    tasks.extend(("images", (images[i:i + chunk],)) for i in range(0, len(images), chunk))
+    return tasks
+
+def run_batch(inputs, workers=None, step=None, start_time=None, attendance_path=None):
+    """Run detection -> recognition -> attendance over recordings. Returns rows marked"""
+    from recognition import FaceRecognition
+    from attendance import AttendanceWriter
+
+    started = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    step = step or CONFIG["batch_frame_step"]
+
+    # Bring the embedding store up to date once; workers then just load it
+    recognizer = FaceRecognition()
+
+    tasks = build_tasks(inputs, step, start_time)
+    print(f"Processing {len(tasks)} tasks on {workers} workers")
+
+    # Earliest sighting per (user_id, day)
+    sightings = {}
+    context = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+    with context.Pool(processes=workers, initializer=_init_worker) as pool:
+        for done, result in enumerate(pool.imap_unordered(run_task, tasks), start=1):
+            for user_id, when in result.items():
+                _note(sightings, (user_id, when.date()), when)
+            print(f"  {done}/{len(tasks)} tasks done")
+
+    # Same writer and de-duplication rules as the live camera
+    writer = AttendanceWriter(attendance_path or os.path.join(os.path.dirname(__file__), "attendance.csv"),
+                              registry=recognizer.registry)
+    marked = 0
+    try:
+        for (user_id, _), when in sorted(sightings.items(), key=lambda item: item[1]):
+            if writer.mark_user(user_id, when):
+                marked += 1
+    finally:
+        writer.close()
+
+    print(f"Marked {marked} new attendance rows in {time.monotonic() - started:.1f}s")
+    return marked
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill attendance from recorded video or snapshot folders")
+    parser.add_argument("inputs", nargs="+", help="video files or folders of images/videos")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--frame-step", type=int, default=None,
+                        help=f"analyse every Nth video frame (default: {CONFIG['batch_frame_step']})")
+    parser.add_argument("--start", default=None,
+                        help="recording start as 'YYYY-MM-DD HH:MM:SS' (default: derived from file time)")
+    args = parser.parse_args(argv)
+
+    start_time = datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S") if args.start else None
+    run_batch(args.inputs, workers=args.workers, step=args.frame_step, start_time=start_time)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""Offline benchmark of detection, recognition and attribute analysis.
+
+    python bench.py --gallery-sizes 100,1000,10000 --faces 1,4,16 --resolutions 640x480,1280x720
+    python bench.py --frames lecture.mp4 --set detection_scale=0.75 --baseline benchmark.json
+
+Runs without a webcam or network: by default models are replaced by
+deterministic stubs, so no weights are downloaded, and frames are synthetic
+(pass --frames to replay a recording or image folder instead). Every case
+reports throughput, per-stage latency percentiles and peak memory, and the
+whole run is written as JSON for comparing against a previous run.
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+import cv2
+import numpy as np
+from config import CONFIG
+import models
+
+STAGES = ("detect", "recognize", "search", "attributes")
+EMBEDDING_DIM = 128
+
+class StubModel:
+    """Deterministic stand-in for a Keras model: a fixed random projection of pooled pixels.
+
+    Identical crops give identical outputs, so a face enrolled from a patch is
+    recognized again when that patch shows up in a frame.
+    """
+
+    def __init__(self, outputs, seed, softmax=False, delay=0.0):
+        self.outputs = outputs
+        self.seed = seed
+        self.softmax = softmax
+        self.delay = delay  # Extra seconds per crop, to mimic a heavier model
+        self.projection = None
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        count, height, width = batch.shape[:3]
+        pooled = batch[:, ::max(1, height // 8), ::max(1, width // 8)].reshape(count, -1) - 0.5
+        if self.projection is None or self.projection.shape[0] != pooled.shape[1]:
+            rng = np.random.default_rng(self.seed)
+            self.projection = rng.standard_normal((pooled.shape[1], self.outputs)).astype(np.float32)
+        output = pooled @ self.projection
+        if self.softmax:
+            output = np.exp(output - output.max(axis=1, keepdims=True))
+            output /= output.sum(axis=1, keepdims=True)
+        if self.delay:
+            time.sleep(self.delay * count)
+        return output
+
+class StubClient:
+    def __init__(self, model, input_shape):
+        self.model = model
+        self.input_shape = input_shape
+
+def install_stub_backend(delay=0.0):
+    """Put stub clients into the model manager so nothing imports deepface"""
+    with models.manager.lock:
+        models.manager.models[CONFIG["model_name"]] = StubClient(StubModel(EMBEDDING_DIM, 1, delay=delay), (160, 160))
+        models.manager.models["Age"] = StubClient(StubModel(101, 2, softmax=True, delay=delay), (224, 224))
+        models.manager.models["Gender"] = StubClient(StubModel(len(models.GENDER_LABELS), 3, softmax=True, delay=delay), (224, 224))
+        models.manager.models["Emotion"] = StubClient(StubModel(len(models.EMOTION_LABELS), 4, softmax=True, delay=delay), (48, 48))
+    models.manager.ready.set()
+
+def isolate_storage(directory):
+    """Point every persisted file at a scratch directory so real data is never touched.
+    Also used by server.py --stub-models and the tests"""
+    for key in ("images_dir", "age_dir"):
+        CONFIG[key] = os.path.join(directory, key)
+        os.makedirs(CONFIG[key], exist_ok=True)
+    CONFIG["ann_dir"] = os.path.join(directory, "ann")
+    for key, file_name in (("age_stats_path", "age_stats.json"), ("embeddings_path", "embeddings.npz"),
+                           ("metadata_cache", "metadata.json"), ("registry_path", "identities.json"),
+                           ("enroll_manifest", "enroll_manifest.json"), ("attendance_db", "attendance.db"),
+                           ("startup_log", "startup_log.jsonl"), ("metrics_export_path", "metrics.prom")):
+        CONFIG[key] = os.path.join(directory, file_name)
+    CONFIG["sections_file"] = None
+    CONFIG["camera_sections"] = None
+
+def _parse_resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def _parse_override(text):
+    key, _, value = text.partition("=")
+    if key not in CONFIG:
+        raise argparse.ArgumentTypeError(f"unknown config key: {key}")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+def make_patches(count, rng, face_dir=None):
+    """Face images to paste into frames: real crops from face_dir, else random textures"""
+    patches = []
+    if face_dir:
+        for file_name in sorted(os.listdir(face_dir)):
+            img = cv2.imread(os.path.join(face_dir, file_name))
+            if img is not None:
+                patches.append(img)
+            if len(patches) == count:
+                break
+    while len(patches) < count:
+        # Upscaled noise is smooth enough to survive resizing to the model input
+        small = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        patches.append(cv2.resize(small, (96, 96), interpolation=cv2.INTER_LINEAR))
+    return patches
+
+def synthetic_frames(count, resolution, faces, patches, rng):
+    """Frames with `faces` patches on a jittered grid. Yields (frame, boxes, identities)"""
+    width, height = resolution
+    columns = int(np.ceil(np.sqrt(faces)))
+    rows = int(np.ceil(faces / columns))
+    cell_w, cell_h = width // columns, height // rows
+    size = max(24, int(min(cell_w, cell_h) * 0.6))
+    background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    for _ in range(count):
+        frame = background.copy()
+        boxes, identities = [], []
+        for i in range(faces):
+            identity = int(rng.integers(len(patches)))
+            x = (i % columns) * cell_w + int(rng.integers(0, max(1, cell_w - size)))
+            y = (i // columns) * cell_h + int(rng.integers(0, max(1, cell_h - size)))
+            frame[y:y+size, x:x+size] = cv2.resize(patches[identity], (size, size))
+            boxes.append((x, y, size, size))
+            identities.append(f"person_{identity}")
+        yield frame, boxes, identities
+
+def recorded_frames(path, count, resolution):
+    """Up to `count` frames from a video file or image folder, resized. Yields (frame, None, None)"""
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+        sources = (cv2.imread(os.path.join(path, f)) for f in files)
+    else:
+        cap = cv2.VideoCapture(path)
+
+        def read():
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        return
+                    yield frame
+            finally:
+                cap.release()
+        sources = read()
+
+    produced = 0
+    for frame in sources:
+        if frame is None:
+            continue
+        yield cv2.resize(frame, resolution), None, None
+        produced += 1
+        if produced == count:
+            return
+
+def build_gallery(recognizer, size, patches, rng):
+    """Fill the recognizer's gallery with the patch identities plus random fillers"""
+    from gallery import GalleryIndex
+    CONFIG["ann_dir"] = os.path.join(os.path.dirname(CONFIG["embeddings_path"]), f"ann_{size}")
+    recognizer.gallery = GalleryIndex(sync=False)
+    known = min(len(patches), size)
+    started = time.perf_counter()
+    embeddings = models.embed_batch(patches[:known])
+    entries = [(f"person_{i}", embedding, 0.0) for i, embedding in enumerate(embeddings)]
+    if size > known:
+        fillers = rng.standard_normal((size - known, embeddings.shape[1])).astype(np.float32)
+        entries.extend((f"filler_{i}", vector, 0.0) for i, vector in enumerate(fillers))
+    recognizer.gallery.add_embeddings(entries)
+    return time.perf_counter() - started
+
+def _run_stages(detector, recognizer, frame, boxes):
+    """One frame through every stage. Returns ({stage: seconds}, names)"""
+    timings = {}
+    started = time.perf_counter()
+    detected = detector.detect_faces(frame)
+    timings["detect"] = time.perf_counter() - started
+
+    # Synthetic frames carry their own boxes, so the face count doesn't depend on the cascade
+    crops = [frame[y:y+h, x:x+w] for (x, y, w, h) in (boxes if boxes is not None else detected)]
+    if not crops:
+        return timings, []
+
+    started = time.perf_counter()
+    names = recognizer.recognize_faces(crops)
+    timings["recognize"] = time.perf_counter() - started
+
+    embeddings = models.embed_batch(crops)
+    started = time.perf_counter()
+    recognizer.gallery.search_batch(embeddings)
+    timings["search"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    detector.analyze_attributes(crops, actions=("age", "emotion"))
+    timings["attributes"] = time.perf_counter() - started
+    return timings, names
+
+def _peak_memory(detector, recognizer, frames):
+    """Peak traced allocation per stage in KiB, over a few frames.
+
+    Measured in a separate pass because tracing slows everything down. Only the
+    Python and numpy heaps are visible, not OpenCV's internal buffers.
+    """
+    peaks = dict.fromkeys(STAGES, 0)
+    stage_calls = {
+        "detect": lambda frame, crops, embeddings: detector.detect_faces(frame),
+        "recognize": lambda frame, crops, embeddings: recognizer.recognize_faces(crops),
+        "search": lambda frame, crops, embeddings: recognizer.gallery.search_batch(embeddings),
+        "attributes": lambda frame, crops, embeddings: detector.analyze_attributes(crops, actions=("age", "emotion"))
+    }
+    tracemalloc.start()
+    try:
+        for frame, boxes in frames:
+            crops = [frame[y:y+h, x:x+w] for (x, y, w, h) in (boxes or detector.detect_faces(frame, stateless=True))]
+            if not crops:
+                continue
+            embeddings = models.embed_batch(crops)
+            for stage, call in stage_calls.items():
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                call(frame, crops, embeddings)
+                peaks[stage] = max(peaks[stage], (tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def run_case(detector, recognizer, frames, warmup, memory_frames):
+    """Time every stage over the frames of one case"""
+    detector.reset()
+    samples = {stage: [] for stage in STAGES}
+    faces_seen, correct, labelled = 0, 0, 0
+    total = 0.0
+    for index, (frame, boxes, identities) in enumerate(frames):
+        timings, names = _run_stages(detector, recognizer, frame, boxes)
+        if index < warmup:
+            continue
+        for stage, seconds in timings.items():
+            samples[stage].append(seconds)
+        total += sum(seconds for stage, seconds in timings.items() if stage != "search")
+        faces_seen += len(names)
+        if identities is not None:
+            labelled += len(identities)
+            correct += sum(name == identity for name, identity in zip(names, identities))
+
+    measured = len(frames) - warmup
+    peaks = _peak_memory(detector, recognizer, [(frame, boxes) for frame, boxes, _ in frames[:memory_frames]])
+    stages = {}
+    for stage in STAGES:
+        values = np.asarray(samples[stage]) * 1000
+        if len(values) == 0:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        stages[stage] = {"count": len(values), "mean_ms": float(values.mean()), "p50_ms": float(p50),
+                         "p95_ms": float(p95), "p99_ms": float(p99), "peak_kib": round(peaks[stage], 1)}
+    return {
+        "frames": measured,
+        "faces": faces_seen,
+        # "search" is part of "recognize", so it isn't counted twice in the frame time
+        "fps": measured / total if total else None,
+        "faces_per_s": faces_seen / total if total else None,
+        "accuracy": correct / labelled if labelled else None,
+        "stages": stages
+    }
+
+def compare(results, baseline_path):
+    """Print per-case throughput and p50 changes against an earlier run"""
+    with open(baseline_path, "r") as f:
+        baseline = {_case_key(case): case for case in json.load(f)["cases"]}
+    print(f"\nChange against {baseline_path}:")
+    for case in results["cases"]:
+        previous = baseline.get(_case_key(case))
+        if previous is None:
+            continue
+        changes = []
+        if case["fps"] and previous["fps"]:
+            changes.append(f"fps {100 * (case['fps'] / previous['fps'] - 1):+.1f}%")
+        for stage, stats in case["stages"].items():
+            before = previous["stages"].get(stage)
+            if before and before["p50_ms"]:
+                changes.append(f"{stage} p50 {100 * (stats['p50_ms'] / before['p50_ms'] - 1):+.1f}%")
+        print(f"  {_case_label(case)}: " + ", ".join(changes))
+
+def _case_key(case):
+    return case["gallery_size"], case["faces_per_frame"], case["resolution"]
+
+def _case_label(case):
+    faces = case["faces_per_frame"] if case["faces_per_frame"] is not None else "recorded"
+    return f"gallery {case['gallery_size']}, faces {faces}, {case['resolution']}"
+
+def run_benchmark(gallery_sizes, faces_per_frame, resolutions, frame_count=50, warmup=5, memory_frames=3,
+                  frames_path=None, face_dir=None, backend="stub", stub_delay=0.0, seed=0):
+    """Run the full sweep. Returns the results document"""
+    scratch = tempfile.mkdtemp(prefix="smarta_bench_")
+    try:
+        isolate_storage(scratch)
+        if backend == "stub":
+            install_stub_backend(stub_delay)
+
+        from detection import FaceDetection
+        from recognition import FaceRecognition
+        detector = FaceDetection(store_ages=False)
+        recognizer = FaceRecognition(sync_gallery=False)
+
+        rng = np.random.default_rng(seed)
+        patches = make_patches(max(faces_per_frame), rng, face_dir)
+        if frames_path:
+            faces_per_frame = [None]
+
+        cases = []
+        for gallery_size in gallery_sizes:
+            build_time = build_gallery(recognizer, gallery_size, patches, np.random.default_rng(seed + gallery_size))
+            for resolution in resolutions:
+                for faces in faces_per_frame:
+                    if frames_path:
+                        frames = list(recorded_frames(frames_path, frame_count + warmup, resolution))
+                    else:
+                        frames = list(synthetic_frames(frame_count + warmup, resolution, faces, patches,
+                                                       np.random.default_rng(seed)))
+                    case = {"gallery_size": gallery_size, "faces_per_frame": faces,
+                            "resolution": "{}x{}".format(*resolution), "gallery_build_s": build_time}
+                    case.update(run_case(detector, recognizer, frames, min(warmup, len(frames)), memory_frames))
+                    cases.append(case)
+                    fps = f"{case['fps']:.1f}" if case["fps"] else "-"
+                    print(f"  {_case_label(case)}: {fps} fps, " + ", ".join(
+                        f"{stage} p50 {stats['p50_ms']:.2f}ms" for stage, stats in case["stages"].items()))
+        detector.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "backend": backend,
+        "seed": seed,
+        "frames_source": frames_path or "synthetic",
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "opencv": cv2.__version__, "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {key: CONFIG[key] for key in (
+            "model_name", "recognition_threshold", "detection_scale", "detection_roi", "detect_every_n",
+            "full_scan_interval", "ann_min_size", "ann_nlist", "ann_nprobe")},
+        "cases": cases
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark detection and recognition without a webcam")
+    parser.add_argument("--gallery-sizes", default="100,1000,10000", help="comma-separated enrolled identities")
+    parser.add_argument("--faces", default="1,4,16", help="comma-separated faces per synthetic frame")
+    parser.add_argument("--resolutions", default="640x480,1280x720", help="comma-separated WIDTHxHEIGHT")
+    parser.add_argument("--frame-count", type=int, default=50, help="measured frames per case")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured frames at the start of each case")
+    parser.add_argument("--memory-frames", type=int, default=3, help="frames traced for peak memory")
+    parser.add_argument("--frames", default=None, help="replay a video file or image folder instead of synthetic frames")
+    parser.add_argument("--face-dir", default=None, help="folder of face crops to paste into synthetic frames")
+    parser.add_argument("--backend", choices=("stub", "deepface"), default="stub",
+                        help="stub models (default) or the real DeepFace models")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="extra seconds per crop in stub models")
+    parser.add_argument("--set", dest="overrides", action="append", type=_parse_override, default=[],
+                        metavar="KEY=VALUE", help="override a config value, e.g. detection_scale=0.75")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="earlier results to compare against")
+    args = parser.parse_args(argv)
+
+    for key, value in args.overrides:
+        CONFIG[key] = value
+    results = run_benchmark(
+        [int(n) for n in args.gallery_sizes.split(",")],
+        [int(n) for n in args.faces.split(",")],
+        [_parse_resolution(r) for r in args.resolutions.split(",")],
+        frame_count=args.frame_count, warmup=args.warmup, memory_frames=args.memory_frames,
+        frames_path=args.frames, face_dir=args.face_dir, backend=args.backend,
+        stub_delay=args.stub_delay, seed=args.seed)
+    results["overrides"] = dict(args.overrides)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Wrote {len(results['cases'])} cases to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
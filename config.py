@@ -1,10 +1,60 @@
-import os
-import cv2
-
-CONFIG = {
-    "images_dir": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "images"),
-    "age_dir": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "ages"),  # Add this line
-    "haar_cascade": cv2.data.haarcascades + "haarcascade_frontalface_default.xml",
-    "recognition_threshold": 0.6,
-    "model_name": "Facenet"
+import os
+import cv2
+
+CONFIG = {
+    "images_dir": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "images"),
+    "age_dir": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "ages"),  # Add this line
+    "age_stats_path": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "age_stats.json"),
+    "embeddings_path": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "embeddings.npz"),
+    "metadata_cache": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "metadata.json"),
+    "registry_path": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "identities.json"),
+    "enroll_manifest": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "enroll_manifest.json"),
+    "ann_dir": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "ann"),
+    "sections_file": os.path.join(os.path.expanduser("~"), "Desktop", "Face_Recog", "Face", "sections.json"),  # Optional {name: section}
+    "haar_cascade": cv2.data.haarcascades + "haarcascade_frontalface_default.xml",
+    "recognition_threshold": 0.6,
+    "detection_scale": 1.0,  # Below 1.0 Haar runs on a downscaled frame, boxes are mapped back to full resolution
+    "detection_roi": False,  # Between full scans, only search around previously found faces
+    "roi_margin": 0.5,  # ROI grows each known box by this fraction of its size
+    "full_scan_interval": 10,  # Frames between full-frame scans when detection_roi is on
+    "detect_every_n": 1,  # Detect on every Nth frame and propagate boxes on the rest
+    "model_name": "Facenet",
+    "ann_min_size": 5000,  # Gallery size at which search switches to the ANN index
+    "ann_nlist": None,  # IVF lists per shard, None for about 4 * sqrt(size)
+    "ann_nprobe": 8,  # Lists scanned per query; higher is better recall, slower
+    "ann_rebuild_ratio": 0.1,  # Rebuild once unindexed adds/removals exceed this share
+    "camera_sections": None,  # e.g. ["CSE-A"] to search only that roster, None for everyone
+    "tracker_iou_threshold": 0.3,
+    "tracker_max_centroid_distance": 0.5,  # Relative to face size
+    "tracker_max_missed": 15,  # Frames before a lost track expires
+    "reverify_interval": 5.0,  # Seconds between re-recognizing a tracked face
+    "inference_workers": 2,
+    "inference_queue_size": 2,  # Pending recognition jobs, oldest dropped when full
+    "attendance_flush_interval": 2.0,  # Seconds between batched attendance writes
+    "age_window": 200,  # Most recent predictions kept per user for the median
+    "age_flush_interval": 30.0,  # Seconds between age histogram saves
+    "attribute_ttl": {"age": 600.0, "emotion": 10.0, "gender": 3600.0},  # Seconds a cached attribute stays fresh
+    "batch_frame_step": 15,  # Headless mode analyses every Nth video frame
+    "batch_segment_frames": 1500,  # Video frames per worker task
+    "batch_image_chunk": 64,  # Snapshots per worker task
+    "enroll_chunk": 16,  # Roster rows per enrollment task
+    "attendance_db": os.path.join(os.path.dirname(os.path.abspath(__file__)), "attendance.db"),
+    "startup_log": os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_log.jsonl"),
+    "metrics_enabled": False,  # Per-stage latency histograms and frame rates
+    "metrics_overlay": False,  # Draw FPS and stage latencies onto the video window
+    "metrics_export_path": os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.prom"),
+    "metrics_export_format": "prometheus",  # "prometheus" text file (overwritten) or "jsonl" (appended)
+    "metrics_export_interval": 10.0,  # Seconds between exports
+    "recognition_server": None,  # e.g. "http://127.0.0.1:8765" to run the UI as a thin client of server.py
+    "server_host": "127.0.0.1",
+    "server_port": 8765,
+    "server_max_batch": 32,  # Face crops per model call across all clients
+    "server_max_wait": 0.01,  # Seconds a request waits for others to join its batch
+    "server_timeout": 10.0,
+    "server_ages_refresh": 5.0,  # Seconds a thin client reuses the median ages it fetched
+    "camera_sources": [0],  # Device indices, video files or RTSP URLs; more than one opens the combined view
+    "camera_names": None,  # Credited in attendance, defaults to cam1, cam2, ...
+    "camera_ring_slots": 8,  # Frames per shared-memory ring; readers lapped by the writer drop the frame
+    "camera_open_timeout": 10.0,
+    "camera_tile_size": (640, 360)  # Size of each camera in the combined view
 }
\ No newline at end of file
@@ -1,64 +1,211 @@
-import cv2
-from deepface import DeepFace
-from config import CONFIG
-import os
-import json
-
-class FaceDetection:
-    def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(CONFIG["haar_cascade"])
-
-    def detect_faces(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        return self.face_cascade.detectMultiScale(gray, 1.1, 5)
-
-    def predict_emotion(self, face_img):
-        try:
-            analysis = DeepFace.analyze(face_img, actions=['emotion'], enforce_detection=False)
-            return analysis[0]['dominant_emotion']
-        except Exception as e:
-            print(f"Emotion prediction error: {e}")
-            return "Unknown"
-
-    def predict_age(self, face_img, user_name=None):
-        try:
-            analysis = DeepFace.analyze(face_img, actions=['age'], enforce_detection=False)
-            age = int(analysis[0]['age'])
-            
-            # If user_name is provided, store the age prediction
-            if user_name:
-                self.store_age_prediction(user_name, age)
-                
-            return age
-        except Exception as e:
-            print(f"Age prediction error: {e}")
-            return "Unknown"
-    
-    def store_age_prediction(self, user_name, age):
-        """Store age prediction for a user"""
-        
-        # Ensure directory exists
-        os.makedirs(CONFIG["age_dir"], exist_ok=True)
-        
-        # Path to store age data
-        age_file = os.path.join(CONFIG["age_dir"], f"{user_name}.json")
-        
-        # Get existing age data or create new
-        if os.path.exists(age_file):
-            with open(age_file, 'r') as f:
-                age_data = json.load(f)
-        else:
-            age_data = {"predictions": []}
-        
-        # Add new prediction
-        age_data["predictions"].append(age)
-        
-        # Calculate median if we have enough predictions
-        if len(age_data["predictions"]) >= 5:
-            sorted_ages = sorted(age_data["predictions"])
-            median_age = sorted_ages[len(sorted_ages) // 2]
-            age_data["median_age"] = median_age
-        
-        # Save data
-        with open(age_file, 'w') as f:
-            json.dump(age_data, f)
\ No newline at end of file
+import cv2
+from config import CONFIG
+import time
+import threading
+import models
+from agestats import AgeStatsStore
+from tracker import iou, centroid_distance
+
+ATTRIBUTES = ("age", "emotion", "gender")
+
+class AttributeCache:
+    """Last predicted attributes per identity, each expiring after its own TTL"""
+
+    def __init__(self):
+        self.entries = {}  # name -> {attribute: (value, timestamp)}
+        self.lock = threading.Lock()
+
+    def stale(self, name, actions, now=None):
+        """Attributes of a user that are missing or older than their TTL"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.entries.get(name, {})
+            return [a for a in actions
+                    if a not in entry or now - entry[a][1] >= CONFIG["attribute_ttl"][a]]
+
+    def get(self, name):
+        with self.lock:
+            return {a: value for a, (value, _) in self.entries.get(name, {}).items()}
+
+    def put(self, name, values, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.entries.setdefault(name, {})
+            for attribute, value in values.items():
+                entry[attribute] = (value, now)
+
+class FaceDetection:
+    def __init__(self, store_ages=True, age_stats=None):
+        self.face_cascade = cv2.CascadeClassifier(CONFIG["haar_cascade"])
+        self.attribute_cache = AttributeCache()
+        # A thin client passes the server's age stats instead of keeping its own file
+        self.age_stats = age_stats if age_stats is not None else (AgeStatsStore() if store_ages else None)
+        self.reset()
+
+    def reset(self):
+        """Forget previous boxes, e.g. when the video source changes"""
+        self.frame_index = 0
+        self.frames_since_full = None  # None until the first full-frame scan
+        self.frames_since_detect = 0
+        self.last_boxes = []
+        self.velocities = []  # Per-box (dx, dy) per frame, for propagation
+
+    def detect_faces(self, frame, stateless=False):
+        """Haar face boxes as (x, y, w, h) in full-resolution coordinates.
+
+        Modes, all set in CONFIG:
+          detection_scale      run the cascade on a downscaled frame
+          detection_roi        between full scans, only search around known faces
+          detect_every_n       detect on every Nth frame, propagate boxes in between
+        With stateless=True every call is an independent full-frame scan.
+        """
+        if stateless:
+            return self._detect_region(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 0, 0)
+
+        self.frame_index += 1
+        self.frames_since_detect += 1
+        if CONFIG["detect_every_n"] > 1 and self.frames_since_full is not None \
+                and self.frame_index % CONFIG["detect_every_n"] != 0:
+            return self._propagate(frame.shape)
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        full_scan = (not CONFIG["detection_roi"] or self.frames_since_full is None
+                     or self.frames_since_full + 1 >= CONFIG["full_scan_interval"])
+        if full_scan:
+            boxes = self._detect_region(gray, 0, 0)
+            self.frames_since_full = 0
+        else:
+            boxes = []
+            for (x0, y0, x1, y1) in self._regions(gray.shape):
+                boxes.extend(self._detect_region(gray[y0:y1, x0:x1], x0, y0))
+            boxes = self._suppress(boxes)
+            self.frames_since_full += 1
+
+        self._update_motion(boxes)
+        return boxes
+
+    def _detect_region(self, gray, offset_x, offset_y):
+        scale = CONFIG["detection_scale"]
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        found = self.face_cascade.detectMultiScale(gray, 1.1, 5)
+        return [(int(x / scale) + offset_x, int(y / scale) + offset_y, int(w / scale), int(h / scale))
+                for (x, y, w, h) in found]
+
+    def _regions(self, shape):
+        """Search windows around the last known boxes, grown by roi_margin"""
+        height, width = shape[:2]
+        margin = CONFIG["roi_margin"]
+        regions = []
+        for (x, y, w, h) in self.last_boxes:
+            dx, dy = int(w * margin), int(h * margin)
+            regions.append((max(0, x - dx), max(0, y - dy), min(width, x + w + dx), min(height, y + h + dy)))
+        return regions
+
+    @staticmethod
+    def _suppress(boxes, threshold=0.3):
+        """Drop duplicates found by overlapping search windows"""
+        kept = []
+        for box in sorted(boxes, key=lambda b: b[2] * b[3], reverse=True):
+            if all(iou(box, other) < threshold for other in kept):
+                kept.append(box)
+        return kept
+
+    def _update_motion(self, boxes):
+        """Estimate per-box velocity against the previous detection"""
+        frames = max(self.frames_since_detect, 1)
+        velocities = []
+        for box in boxes:
+            previous = min(self.last_boxes, key=lambda b: centroid_distance(box, b), default=None)
+            if previous is not None and centroid_distance(box, previous) <= CONFIG["tracker_max_centroid_distance"]:
+                velocities.append(((box[0] - previous[0]) / frames, (box[1] - previous[1]) / frames))
+            else:
+                velocities.append((0.0, 0.0))
+        self.last_boxes = list(boxes)
+        self.velocities = velocities
+        self.frames_since_detect = 0
+
+    def _propagate(self, shape):
+        """Move the last detected boxes along their velocity instead of detecting"""
+        height, width = shape[:2]
+        frames = self.frames_since_detect
+        boxes = []
+        for (x, y, w, h), (vx, vy) in zip(self.last_boxes, self.velocities):
+            nx = min(max(int(x + vx * frames), 0), max(width - w, 0))
+            ny = min(max(int(y + vy * frames), 0), max(height - h, 0))
+            boxes.append((nx, ny, w, h))
+        return boxes
+
+    def predict_emotion(self, face_img):
+        return self.predict_emotions([face_img])[0]
+
+    def predict_age(self, face_img, user_name=None):
+        return self.predict_ages([face_img], [user_name])[0]
+
+    def predict_emotions(self, face_imgs):
+        """Batched emotion prediction for all crops of one frame"""
+        try:
+            return models.predict_emotions(face_imgs)
+        except Exception as e:
+            print(f"Emotion prediction error: {e}")
+            return ["Unknown"] * len(face_imgs)
+
+    def predict_ages(self, face_imgs, user_names=None):
+        """Batched age prediction for all crops of one frame"""
+        try:
+            ages = models.predict_ages(face_imgs)
+        except Exception as e:
+            print(f"Age prediction error: {e}")
+            return ["Unknown"] * len(face_imgs)
+
+        if user_names:
+            for user_name, age in zip(user_names, ages):
+                if user_name and user_name != "Unknown":
+                    self.store_age_prediction(user_name, age)
+        return ages
+    
+    def analyze_attributes(self, face_imgs, user_names=None, actions=ATTRIBUTES):
+        """Age, emotion and gender for every crop from one fused analysis pass.
+
+        Known identities only re-run the attributes whose cached value has
+        outlived its TTL in CONFIG["attribute_ttl"]; the rest come from cache.
+        """
+        user_names = user_names or [None] * len(face_imgs)
+        now = time.monotonic()
+        needed = []
+        for name in user_names:
+            if name and name != "Unknown":
+                needed.append(self.attribute_cache.stale(name, actions, now))
+            else:
+                needed.append(list(actions))
+
+        try:
+            fresh = models.analyze_batch(face_imgs, needed)
+        except Exception as e:
+            print(f"Attribute analysis error: {e}")
+            fresh = [{} for _ in face_imgs]
+
+        results = []
+        for name, values in zip(user_names, fresh):
+            if name and name != "Unknown":
+                self.attribute_cache.put(name, values, now)
+                if "age" in values:
+                    self.store_age_prediction(name, values["age"])
+                cached = self.attribute_cache.get(name)
+            else:
+                cached = values
+            results.append({a: cached.get(a, "Unknown") for a in actions})
+        return results
+
+    def store_age_prediction(self, user_name, age):
+        """Store age prediction for a user"""
+        if self.age_stats is not None:
+            self.age_stats.add(user_name, age)
+
+    def median_age(self, user_name):
+        """Running median age, or None until enough predictions exist"""
+        return self.age_stats.median(user_name) if self.age_stats is not None else None
+
+    def close(self):
+        if self.age_stats is not None:
+            self.age_stats.close()
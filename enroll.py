@@ -0,0 +1,211 @@
+"""Bulk enrollment from a roster CSV with columns name, roll_no, photo (and optional section).
+
+    python enroll.py roster.csv --workers 8 --report enroll_failures.csv
+
+Photo paths may be relative to the roster file. Re-running only recomputes
+rows whose photo changed since the last successful enrollment.
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+import cv2
+from config import CONFIG
+
+# Per-process state, filled once by _init_worker
+_detector = None
+
+def _init_worker():
+    """Load the detector once per worker process"""
+    global _detector
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    cv2.setNumThreads(1)
+
+    from detection import FaceDetection
+    _detector = FaceDetection(store_ages=False)
+
+def _crop_face(path):
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError("photo could not be read")
+    faces = _detector.detect_faces(img, stateless=True)
+    if len(faces) == 0:
+        raise ValueError("no face found in photo")
+    # The largest face in a roster photo is the student
+    x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+    return img[y:y+h, x:x+w]
+
+def process_rows(rows):
+    """Crop, embed and predict gender for a chunk of roster rows.
+    Returns (row, crop, embedding, gender, error) tuples"""
+    import models
+
+    results, crops, cropped = [], [], []
+    for row in rows:
+        try:
+            crops.append(_crop_face(row["photo"]))
+            cropped.append(row)
+        except Exception as e:
+            results.append((row, None, None, None, str(e)))
+
+    if cropped:
+        try:
+            embeddings = models.embed_batch(crops)
+            genders = [r.get("gender", "Unknown") for r in models.analyze_batch(crops, [("gender",)] * len(crops))]
+            results.extend((row, crop, embedding, gender, None)
+                           for row, crop, embedding, gender in zip(cropped, crops, embeddings, genders))
+        except Exception as e:
+            results.extend((row, None, None, None, f"embedding failed: {e}") for row in cropped)
+    return results
+
+def read_roster(path):
+    """Parse the roster. Returns (rows, failures)"""
+    rows, failures, seen = [], [], set()
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", newline="") as f:
+        for line, record in enumerate(csv.DictReader(f), start=2):
+            name = (record.get("name") or "").strip()
+            roll_no = (record.get("roll_no") or "").strip()
+            photo = (record.get("photo") or "").strip()
+            if not name or not roll_no or not photo:
+                failures.append({"line": line, "name": name, "error": "missing name, roll_no or photo"})
+                continue
+            if name in seen:
+                failures.append({"line": line, "name": name, "error": "duplicate name in roster"})
+                continue
+            photo = photo if os.path.isabs(photo) else os.path.join(base_dir, photo)
+            if not os.path.exists(photo):
+                failures.append({"line": line, "name": name, "error": f"photo not found: {photo}"})
+                continue
+            seen.add(name)
+            section = (record.get("section") or "").strip() or None
+            rows.append({"line": line, "name": name, "roll_no": roll_no, "photo": photo, "section": section})
+    return rows, failures
+
+def _signature(photo):
+    stat = os.stat(photo)
+    return [os.path.abspath(photo), stat.st_mtime, stat.st_size]
+
+def _load_manifest():
+    if os.path.exists(CONFIG["enroll_manifest"]):
+        with open(CONFIG["enroll_manifest"], "r") as f:
+            return json.load(f)
+    return {}
+
+def _save_manifest(manifest):
+    tmp_path = CONFIG["enroll_manifest"] + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, CONFIG["enroll_manifest"])
+
+def commit(recognizer, enrolled, manifest):
+    """Write images, roll numbers, index entries and the manifest together.
+
+    Images are staged as .part files and only renamed into place once every
+    one of them encoded and wrote cleanly. The manifest is saved last, so an
+    interrupted run is simply redone on the next invocation.
+    """
+    os.makedirs(CONFIG["images_dir"], exist_ok=True)
+    staged = []
+    try:
+        for row, crop, embedding, gender in enrolled:
+            ok, encoded = cv2.imencode(".jpg", crop)
+            if not ok:
+                raise ValueError(f"could not encode face for {row['name']}")
+            img_path = os.path.join(CONFIG["images_dir"], f"{row['name']}.jpg")
+            with open(img_path + ".part", "wb") as f:
+                f.write(encoded.tobytes())
+            staged.append(img_path)
+    except Exception:
+        for img_path in staged:
+            os.remove(img_path + ".part")
+        raise
+
+    entries = []
+    for img_path, (row, _, embedding, gender) in zip(staged, enrolled):
+        os.replace(img_path + ".part", img_path)
+        record = recognizer.registry.register(row["name"], row["roll_no"], f"{row['name']}.jpg",
+                                              section=row["section"], persist=False)
+        recognizer.metadata.store(img_path, gender)
+        entries.append((record["user_id"], embedding, os.path.getmtime(img_path)))
+        if row["section"]:
+            recognizer.gallery.sections[record["user_id"]] = row["section"]
+
+    recognizer.registry.save()
+    recognizer.gallery.add_embeddings(entries)
+    recognizer.metadata.save()
+    for row, *_ in enrolled:
+        manifest[row["name"]] = {"signature": _signature(row["photo"]), "roll_no": row["roll_no"]}
+    _save_manifest(manifest)
+
+def enroll(roster_path, workers=None):
+    """Enroll every changed roster row. Returns (enrolled, skipped, failures)"""
+    from recognition import FaceRecognition
+
+    started = time.monotonic()
+    rows, failures = read_roster(roster_path)
+    recognizer = FaceRecognition(sync_gallery=False)
+    manifest = _load_manifest()
+
+    todo, skipped = [], 0
+    for row in rows:
+        previous = manifest.get(row["name"])
+        img_path = os.path.join(CONFIG["images_dir"], f"{row['name']}.jpg")
+        record = recognizer.registry.by_name(row["name"])
+        if previous and previous["signature"] == _signature(row["photo"]) and os.path.exists(img_path) \
+                and record is not None and record["user_id"] in recognizer.gallery:
+            if previous["roll_no"] != row["roll_no"]:
+                # Only the roll number changed, no need to touch the face
+                recognizer.save_roll_no(row["name"], row["roll_no"])
+                previous["roll_no"] = row["roll_no"]
+            skipped += 1
+        else:
+            todo.append(row)
+
+    enrolled = []
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        chunk = CONFIG["enroll_chunk"]
+        chunks = [todo[i:i + chunk] for i in range(0, len(todo), chunk)]
+        print(f"Enrolling {len(todo)} rows ({skipped} unchanged) on {workers} workers")
+        context = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        with context.Pool(processes=workers, initializer=_init_worker) as pool:
+            for results in pool.imap_unordered(process_rows, chunks):
+                for row, crop, embedding, gender, error in results:
+                    if error:
+                        failures.append({"line": row["line"], "name": row["name"], "error": error})
+                    else:
+                        enrolled.append((row, crop, embedding, gender))
+
+    if enrolled:
+        commit(recognizer, enrolled, manifest)
+    elif skipped:
+        _save_manifest(manifest)  # Roll number updates
+
+    failures.sort(key=lambda failure: failure["line"])
+    print(f"Enrolled {len(enrolled)}, unchanged {skipped}, failed {len(failures)} "
+          f"in {time.monotonic() - started:.1f}s")
+    for failure in failures:
+        print(f"  line {failure['line']} ({failure['name'] or '?'}): {failure['error']}")
+    return len(enrolled), skipped, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll students in bulk from a roster CSV")
+    parser.add_argument("roster", help="CSV with name, roll_no and photo columns")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--report", default=None, help="write per-row failures to this CSV")
+    args = parser.parse_args(argv)
+
+    _, _, failures = enroll(args.roster, workers=args.workers)
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["line", "name", "error"])
+            writer.writeheader()
+            writer.writerows(failures)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
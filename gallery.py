@@ -0,0 +1,344 @@
+import os
+import io
+import json
+import threading
+import cv2
+import numpy as np
+from config import CONFIG
+from ann import ShardedIndex
+import models
+
+class GalleryIndex:
+    """Keeps every enrolled face embedding in one contiguous matrix.
+
+    Rows are keyed by key_of(image file), the registry's user ID; without a
+    key_of the image's file stem is used.
+    """
+
+    def __init__(self, images_dir=None, store_path=None, sync=True, sections=None, key_of=None):
+        self.images_dir = images_dir or CONFIG["images_dir"]
+        self.key_of = key_of or (lambda image_file: os.path.splitext(image_file)[0])
+        self.store_path = store_path or CONFIG["embeddings_path"]
+        self.names = []
+        self.mtimes = []
+        self.positions = {}  # name -> row in the matrix
+        self.size = 0
+        self._data = np.zeros((0, 0), dtype=np.float32)
+        self.lock = threading.RLock()
+        # Key -> class/section for sharded search; the sections file is keyed by image stem
+        self.sections = {self.key_of(f"{name}.jpg") or name: section
+                         for name, section in self._load_sections().items()}
+        self.sections.update(sections or {})
+        self.ann = None  # Approximate index, used once the gallery reaches ann_min_size
+        self.ann_stale = False  # Saved ANN index holds vectors from a discarded store
+        self.ann_changes = None  # Names changed while a rebuild clusters, replayed into the new index
+        self.load(sync)
+
+    @property
+    def matrix(self):
+        return self._data[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed(self, img):
+        """Compute a normalized embedding for an image array or image path"""
+        if isinstance(img, str):
+            img = cv2.imread(img)
+            if img is None:
+                raise ValueError("image could not be read")
+        return self._normalize(models.embed_batch([img])[0])
+
+    def load(self, sync=True):
+        """Load the sidecar store and bring it in line with the images folder"""
+        if os.path.exists(self.store_path):
+            try:
+                with np.load(self.store_path, allow_pickle=False) as store:
+                    if self._compatible(store):
+                        embeddings = store["embeddings"].astype(np.float32)
+                        self.names = [str(n) for n in store["names"]]
+                        self.mtimes = [float(m) for m in store["mtimes"]]
+                        self.positions = {n: i for i, n in enumerate(self.names)}
+                        self.size = len(self.names)
+                        self._data = embeddings
+                    else:
+                        # Every image gets re-embedded, and the ANN index built from the old vectors goes too
+                        self.ann_stale = True
+            except Exception as e:
+                print(f"Error loading embedding store: {e}")
+
+        if sync:
+            self.refresh()
+        else:
+            self._update_ann()
+
+    @staticmethod
+    def _compatible(store):
+        """True if the store was written by the same model and crop preprocessing"""
+        return (str(store["model_name"]) == CONFIG["model_name"]
+                and "preprocessing" in store.files
+                and str(store["preprocessing"]) == models.EMBEDDING_PREPROCESSING)
+
+    def refresh(self):
+        """Sync with the images folder and save if anything changed"""
+        if self.sync():
+            with self.lock:
+                self.save()
+        self._update_ann()
+
+    @staticmethod
+    def _load_sections():
+        path = CONFIG["sections_file"]
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading sections: {e}")
+            return {}
+
+    def _update_ann(self):
+        """Memory-map the saved ANN index and patch in whatever changed since it was built"""
+        with self.lock:
+            if self.size < CONFIG["ann_min_size"]:
+                self.ann = None
+                return
+            stale = self.ann_stale
+        try:
+            ann, built_from = (None, None) if stale else ShardedIndex.load(CONFIG["ann_dir"])
+        except Exception as e:
+            print(f"Error loading ANN index: {e}")
+            ann, built_from = None, None
+        if ann is None:
+            self.rebuild_ann()
+            return
+
+        with self.lock:
+            current = dict(zip(self.names, self.mtimes))
+            for name in set(built_from) - set(current):
+                ann.remove(name)
+            for name, mtime in current.items():
+                section = self.sections.get(name, "")
+                if built_from.get(name) != mtime or ann.section_of.get(name) != section:
+                    ann.add(name, self.matrix[self.positions[name]], section)
+            self.ann = ann
+            rebuild = self._needs_rebuild()
+        if rebuild:
+            self.rebuild_ann()
+
+    def _needs_rebuild(self):
+        """Called with the lock held: no index yet, or too many unclustered changes"""
+        if self.ann is None:
+            return self.size >= CONFIG["ann_min_size"]
+        return self.ann.pending_changes() > CONFIG["ann_rebuild_ratio"] * self.size
+
+    def rebuild_ann(self):
+        """Cluster the whole gallery into a fresh ANN index and save it.
+
+        Clustering runs without the lock, so searches carry on against the
+        old index; rows changed meanwhile are patched in before the swap.
+        """
+        with self.lock:
+            if self.ann_changes is not None:
+                return  # Another thread is already rebuilding
+            self.ann_changes = set()
+            names, vectors = list(self.names), self.matrix.copy()
+            mtimes = dict(zip(self.names, self.mtimes))
+            sections = dict(self.sections)
+        try:
+            ann = ShardedIndex.build(names, vectors, sections, nlist=CONFIG["ann_nlist"])
+            try:
+                ann.save(CONFIG["ann_dir"], mtimes)
+            except Exception as e:
+                print(f"Error saving ANN index: {e}")
+        except Exception:
+            with self.lock:
+                self.ann_changes = None
+            raise
+        with self.lock:
+            for name in self.ann_changes:
+                if name in self.positions:
+                    ann.add(name, self.matrix[self.positions[name]], self.sections.get(name, ""))
+                else:
+                    ann.remove(name)
+            self.ann_changes = None
+            self.ann = ann
+            self.ann_stale = False
+
+    def sync(self):
+        """Embed new or changed images and drop deleted ones. Returns True if anything changed
+
+        Images are embedded without holding the lock, so searches carry on
+        meanwhile; the lock is only taken to read the rows and patch them.
+        """
+        if not os.path.exists(self.images_dir):
+            return False
+
+        with self.lock:
+            known = dict(zip(self.names, self.mtimes))
+        on_disk = {}
+        for image_file in os.listdir(self.images_dir):
+            key = self.key_of(image_file) if image_file.endswith('.jpg') else None
+            if key is not None:
+                path = os.path.join(self.images_dir, image_file)
+                on_disk[key] = (path, os.path.getmtime(path))
+
+        missing = [name for name in known if name not in on_disk]
+        embedded = []
+        for name, (path, mtime) in on_disk.items():
+            if known.get(name) == mtime:
+                continue
+            try:
+                embedded.append((name, self.embed(path), mtime))
+            except Exception as e:
+                print(f"Error embedding {path}: {e}")
+        if not missing and not embedded:
+            return False
+
+        with self.lock:
+            # Skip rows added or replaced while we were embedding; those copies are newer
+            for name in missing:
+                if self._mtime(name) == known[name]:
+                    self.remove(name, persist=False)
+            for name, embedding, mtime in embedded:
+                if self._mtime(name) == known.get(name):
+                    self._put(name, embedding, mtime)
+        return True
+
+    def _mtime(self, name):
+        row = self.positions.get(name)
+        return self.mtimes[row] if row is not None else None
+
+    def save(self):
+        """Write the index atomically to the sidecar store"""
+        os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            model_name=np.array(CONFIG["model_name"]),
+            preprocessing=np.array(models.EMBEDDING_PREPROCESSING),
+            names=np.array(self.names, dtype=str),
+            mtimes=np.array(self.mtimes, dtype=np.float64),
+            embeddings=self.matrix
+        )
+        tmp_path = self.store_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, self.store_path)
+
+    def _put(self, name, embedding, mtime):
+        if self.ann_changes is not None:
+            self.ann_changes.add(name)
+        row = self.positions.get(name)
+        if row is not None:
+            self._data[row] = embedding
+            self.mtimes[row] = mtime
+            return
+
+        # Grow geometrically so repeated registrations don't copy the matrix each time
+        if self.size == 0 and self._data.shape[-1] != embedding.shape[0]:
+            self._data = np.zeros((0, embedding.shape[0]), dtype=np.float32)
+        if self.size == self._data.shape[0]:
+            grown = np.zeros((max(16, self.size * 2), embedding.shape[0]), dtype=np.float32)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+
+        self._data[self.size] = embedding
+        self.names.append(name)
+        self.mtimes.append(mtime)
+        self.positions[name] = self.size
+        self.size += 1
+
+    def add(self, name, face_img, img_path=None):
+        """Add or replace a single identity without rebuilding the index"""
+        mtime = os.path.getmtime(img_path) if img_path and os.path.exists(img_path) else 0.0
+        embedding = self.embed(face_img)
+        with self.lock:
+            self._put(name, embedding, mtime)
+            self.save()
+            if self.ann is not None:
+                self.ann.add(name, embedding, self.sections.get(name, ""))
+            rebuild = self._needs_rebuild()
+        if rebuild:
+            self.rebuild_ann()
+
+    def add_embeddings(self, entries):
+        """Add or replace many (name, embedding, image mtime) entries with a single save"""
+        with self.lock:
+            for name, embedding, mtime in entries:
+                embedding = self._normalize(embedding)
+                self._put(name, embedding, mtime)
+                if self.ann is not None:
+                    self.ann.add(name, embedding, self.sections.get(name, ""))
+            self.save()
+            rebuild = self._needs_rebuild()
+        if rebuild:
+            self.rebuild_ann()
+
+    def remove(self, name, persist=True):
+        with self.lock:
+            row = self.positions.pop(name, None)
+            if row is None:
+                return
+            if self.ann_changes is not None:
+                self.ann_changes.add(name)
+            last = self.size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix contiguous
+                self._data[row] = self._data[last]
+                self.names[row] = self.names[last]
+                self.mtimes[row] = self.mtimes[last]
+                self.positions[self.names[row]] = row
+            self.names.pop()
+            self.mtimes.pop()
+            self.size = last
+            if self.ann is not None:
+                self.ann.remove(name)
+            if persist:
+                self.save()
+
+    def search(self, embedding):
+        """Return (name, cosine distance) of the closest identity, or (None, None)"""
+        return self.search_batch([self._normalize(embedding)])[0]
+
+    def search_batch(self, embeddings):
+        """Closest identity for every row of an (N, d) embedding matrix in one product"""
+        queries = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True) if len(queries) else None
+        with self.lock:
+            if self.size == 0 or len(queries) == 0:
+                return [(None, None)] * len(queries)
+            queries = queries / np.where(norms > 0, norms, 1)
+            sections = CONFIG["camera_sections"]
+            if self.ann is not None:
+                return self.ann.search(queries, CONFIG["ann_nprobe"], sections)
+
+            distances = 1.0 - queries @ self.matrix.T
+            if sections is not None:
+                # Only this camera's roster is eligible
+                allowed = np.array([self.sections.get(n, "") in sections for n in self.names])
+                if not allowed.any():
+                    return [(None, None)] * len(queries)
+                distances[:, ~allowed] = np.inf
+            best = np.argmin(distances, axis=1)
+            return [(self.names[j], float(distances[i, j])) for i, j in enumerate(best)]
+
+    def match(self, face_img):
+        """Identify a face crop against the gallery using the recognition threshold"""
+        return self.match_batch([face_img])[0]
+
+    def match_batch(self, face_imgs):
+        """Identify all crops of one frame with a single embedding pass"""
+        results = self.search_batch(models.embed_batch(face_imgs))
+        return [name if name is not None and distance < CONFIG["recognition_threshold"] else "Unknown"
+                for name, distance in results]
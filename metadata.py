@@ -0,0 +1,134 @@
+import os
+import io
+import json
+import base64
+import threading
+import cv2
+from PIL import Image
+from config import CONFIG
+import models
+
+class UserMetadataCache:
+    """Per-user gender and thumbnail, persisted and keyed on the image mtime.
+
+    With read_only=True the file is never written, only re-read when the
+    process that owns it saves; anything missing is computed in memory.
+    """
+
+    def __init__(self, cache_path=None, predict_genders=None, read_only=False):
+        self.cache_path = cache_path or CONFIG["metadata_cache"]
+        # Local models by default; a thin client passes the server's predictor
+        self.predict_genders = predict_genders or models.predict_genders
+        self.read_only = read_only
+        self.entries = {}  # image path -> cached fields
+        self.loaded_mtime = None
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            self.loaded_mtime = os.path.getmtime(self.cache_path)
+            with open(self.cache_path, 'r') as f:
+                entries = json.load(f)
+            with self.lock:
+                self.entries.update(entries)
+        except Exception as e:
+            print(f"Error loading metadata cache: {e}")
+
+    def _reload_if_changed(self):
+        if not self.read_only:
+            return
+        try:
+            mtime = os.path.getmtime(self.cache_path)
+        except OSError:
+            return
+        if mtime != self.loaded_mtime:
+            self.load()
+
+    def save(self):
+        """Write the cache atomically if anything changed"""
+        if self.read_only:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries)
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def _thumbnail(img_path):
+        img = Image.open(img_path)
+        img.thumbnail((60, 60))
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    def _predict_gender(self, img_path):
+        try:
+            img = cv2.imread(img_path)
+            if img is None:
+                raise ValueError("image could not be read")
+            return self.predict_genders([img])[0]
+        except Exception as e:
+            print(f"Error predicting gender for {img_path}: {e}")
+            return "Unknown"
+
+    def _entry(self, img_path):
+        """Entry for the current image, with a fresh thumbnail if the file changed"""
+        mtime = os.path.getmtime(img_path)
+        self._reload_if_changed()
+        with self.lock:
+            entry = self.entries.get(img_path)
+            if entry and entry.get("image_mtime") == mtime:
+                return entry
+
+        entry = {"image_mtime": mtime, "thumbnail": self._thumbnail(img_path), "gender": None}
+        with self.lock:
+            self.entries[img_path] = entry
+            self.dirty = True
+        return entry
+
+    def refresh(self, img_path):
+        """Recompute gender and thumbnail if the image changed since it was cached"""
+        entry = self._entry(img_path)
+        if entry.get("gender") is None:
+            gender = self._predict_gender(img_path)
+            with self.lock:
+                entry["gender"] = gender
+                self.dirty = True
+        return entry
+
+    def store(self, img_path, gender):
+        """Cache an image whose gender was already predicted elsewhere"""
+        entry = {"image_mtime": os.path.getmtime(img_path), "thumbnail": self._thumbnail(img_path), "gender": gender}
+        with self.lock:
+            self.entries[img_path] = entry
+            self.dirty = True
+
+    def get(self, img_path):
+        """Cached entry for an image, filled in on first use"""
+        return self.refresh(img_path)
+
+    def gender(self, img_path, predict=True):
+        """Cached gender. With predict=False a missing value returns None instead of running a model"""
+        if predict:
+            return self.refresh(img_path)["gender"]
+        return self._entry(img_path).get("gender")
+
+    def thumbnail(self, img_path):
+        """Pre-rendered 60x60 thumbnail as a PIL image"""
+        data = base64.b64decode(self._entry(img_path)["thumbnail"])
+        return Image.open(io.BytesIO(data))
+
+    def forget(self, img_path):
+        with self.lock:
+            if self.entries.pop(img_path, None) is not None:
+                self.dirty = True
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from config import CONFIG
+
+# Log-spaced latency buckets from 10us up to ~90s, 25% apart
+BUCKETS = [1e-5 * 1.25 ** i for i in range(72)]
+
+class _NullTimer:
+    """Shared no-op context manager handed out while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+class Histogram:
+    """Fixed-bucket latency histogram with approximate percentiles"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        # Linear scan is fine: most samples land in the first few dozen buckets
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, capped at the largest sample"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(BUCKETS[min(index, len(BUCKETS) - 1)], self.max)
+        return self.max
+
+class Metrics:
+    """Per-stage latency histograms and event counters for the camera pipeline"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.rates = {}
+        self._rate_base = (time.monotonic(), {})
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def timer(self, stage):
+        """Context manager timing one stage; costs one attribute check when disabled"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _update_rates(self, now):
+        started, base = self._rate_base
+        elapsed = now - started
+        if elapsed < 1.0:
+            return
+        self.rates = {name: (value - base.get(name, 0)) / elapsed for name, value in self.counters.items()}
+        self._rate_base = (now, dict(self.counters))
+
+    def snapshot(self):
+        """Percentiles per stage, counter totals and per-second rates"""
+        with self.lock:
+            self._update_rates(time.monotonic())
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "sum": h.total,
+                    "mean": h.total / h.count if h.count else 0.0,
+                    "p50": h.percentile(0.50),
+                    "p95": h.percentile(0.95),
+                    "p99": h.percentile(0.99)
+                }
+                for stage, h in self.histograms.items()
+            }
+            return {"stages": stages, "counters": dict(self.counters), "rates": dict(self.rates)}
+
+    def overlay_lines(self):
+        """Short text lines for drawing onto the video window"""
+        snapshot = self.snapshot()
+        rates = snapshot["rates"]
+        lines = ["FPS display {:.1f} | capture {:.1f} | detect {:.1f}".format(
+            rates.get("frames_displayed", 0.0), rates.get("frames_captured", 0.0), rates.get("frames_detected", 0.0))]
+        for stage, stats in sorted(snapshot["stages"].items()):
+            lines.append(f"{stage}: p50 {stats['p50'] * 1000:.1f}ms  p95 {stats['p95'] * 1000:.1f}ms")
+        return lines
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = ["# TYPE smarta_stage_latency_seconds summary"]
+        for stage, stats in sorted(snapshot["stages"].items()):
+            for q in ("p50", "p95", "p99"):
+                quantile = {"p50": "0.5", "p95": "0.95", "p99": "0.99"}[q]
+                lines.append(f'smarta_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[q]:.6f}')
+            lines.append(f'smarta_stage_latency_seconds_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'smarta_stage_latency_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append("# TYPE smarta_events_total counter")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f'smarta_events_total{{event="{name}"}} {value}')
+        lines.append("# TYPE smarta_event_rate gauge")
+        for name, value in sorted(snapshot["rates"].items()):
+            lines.append(f'smarta_event_rate{{event="{name}"}} {value:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Write the current metrics to metrics_export_path"""
+        path = CONFIG["metrics_export_path"]
+        try:
+            if CONFIG["metrics_export_format"] == "jsonl":
+                record = dict(self.snapshot(), timestamp=datetime.now().isoformat(timespec="seconds"))
+                with open(path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            else:
+                # Replaced atomically so a textfile collector never reads half a file
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(self.prometheus_text())
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Metrics export error: {e}")
+
+    def start_exporter(self):
+        if not self.enabled or self.thread is not None:
+            return
+
+        def run():
+            while not self.stop_event.wait(CONFIG["metrics_export_interval"]):
+                self.export()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def stop_exporter(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout=1.0)
+        self.thread = None
+        self.export()
+
+metrics = Metrics(CONFIG["metrics_enabled"])
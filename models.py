@@ -0,0 +1,141 @@
+import time
+import threading
+import cv2
+import numpy as np
+from config import CONFIG
+
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+GENDER_LABELS = ["Woman", "Man"]
+
+class ModelManager:
+    """Builds DeepFace models on first use or on a background warm-up thread.
+
+    deepface (and with it TensorFlow) is only imported when the first model
+    is built, so importing this module stays cheap.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.load_times = {}  # model name -> seconds spent building it
+        self.warm_up_time = None
+        self.thread = None
+
+    def get(self, name, task="facial_recognition"):
+        """Build a DeepFace model once and reuse it for every batch"""
+        with self.lock:
+            if name not in self.models:
+                started = time.monotonic()
+                from deepface import DeepFace
+                try:
+                    self.models[name] = DeepFace.build_model(model_name=name, task=task)
+                except TypeError:
+                    # Older deepface releases don't take a task argument
+                    self.models[name] = DeepFace.build_model(name)
+                self.load_times[name] = time.monotonic() - started
+            return self.models[name]
+
+    def warm_up(self, after_load=None):
+        """Load every model on a daemon thread, then run after_load there too"""
+        if self.thread is not None:
+            return self.thread
+
+        def run():
+            started = time.monotonic()
+            try:
+                self.get(CONFIG["model_name"])
+                for name in ("Age", "Emotion", "Gender"):
+                    self.get(name, task="facial_attribute")
+                if after_load:
+                    after_load()
+            except Exception as e:
+                print(f"Model warm-up error: {e}")
+            finally:
+                self.warm_up_time = time.monotonic() - started
+                self.ready.set()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+manager = ModelManager()
+
+def get_model(name, task="facial_recognition"):
+    return manager.get(name, task)
+
+# Stored embeddings are only comparable with new ones if the crops were prepared
+# the same way; bump this whenever prepare_batch or embed_batch change
+EMBEDDING_PREPROCESSING = "bgr-resize-unit-v1"
+
+def prepare_batch(face_imgs, target_size, grayscale=False):
+    """Resize BGR face crops into one float32 tensor scaled to [0, 1]"""
+    height, width = target_size
+    channels = 1 if grayscale else 3
+    batch = np.empty((len(face_imgs), height, width, channels), dtype=np.float32)
+    for i, face_img in enumerate(face_imgs):
+        if grayscale:
+            face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+        resized = cv2.resize(face_img, (width, height))
+        batch[i] = resized.reshape(height, width, channels)
+    batch /= 255.0
+    return batch
+
+def _run(model, batch):
+    return np.asarray(model.predict(batch, verbose=0))
+
+def embed_batch(face_imgs):
+    """Facenet embeddings for all crops in one forward pass"""
+    if len(face_imgs) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    client = get_model(CONFIG["model_name"])
+    batch = prepare_batch(face_imgs, client.input_shape)
+    return _run(client.model, batch).astype(np.float32)
+
+def analyze_batch(face_imgs, actions_per_face):
+    """Age, gender and emotion in one pass: crops are preprocessed once and each
+    model runs once over the crops that asked for it"""
+    results = [{} for _ in face_imgs]
+    wanted = {action: [i for i, actions in enumerate(actions_per_face) if action in actions]
+              for action in ("age", "gender", "emotion")}
+    rows = sorted(set().union(*wanted.values()))
+    if not rows:
+        return results
+
+    batch = prepare_batch([face_imgs[i] for i in rows], (224, 224))
+    position = {i: row for row, i in enumerate(rows)}
+
+    if wanted["age"]:
+        client = get_model("Age", task="facial_attribute")
+        probs = _run(client.model, batch[[position[i] for i in wanted["age"]]])
+        for i, age in zip(wanted["age"], probs @ np.arange(probs.shape[1])):
+            results[i]["age"] = int(age)
+
+    if wanted["gender"]:
+        client = get_model("Gender", task="facial_attribute")
+        probs = _run(client.model, batch[[position[i] for i in wanted["gender"]]])
+        for i, label in zip(wanted["gender"], np.argmax(probs, axis=1)):
+            results[i]["gender"] = GENDER_LABELS[label]
+
+    if wanted["emotion"]:
+        # The emotion model takes 48x48 grayscale, derived from the shared batch
+        client = get_model("Emotion", task="facial_attribute")
+        faces = batch[[position[i] for i in wanted["emotion"]]]
+        gray = np.stack([cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), (48, 48)) for face in faces])
+        probs = _run(client.model, gray[..., np.newaxis])
+        for i, label in zip(wanted["emotion"], np.argmax(probs, axis=1)):
+            results[i]["emotion"] = EMOTION_LABELS[label]
+
+    return results
+
+def predict_ages(face_imgs):
+    """Apparent age for every crop in one forward pass"""
+    return [r["age"] for r in analyze_batch(face_imgs, [("age",)] * len(face_imgs))]
+
+def predict_emotions(face_imgs):
+    """Dominant emotion for every crop in one forward pass"""
+    return [r["emotion"] for r in analyze_batch(face_imgs, [("emotion",)] * len(face_imgs))]
+
+def predict_genders(face_imgs):
+    """Dominant gender for every crop in one forward pass"""
+    return [r["gender"] for r in analyze_batch(face_imgs, [("gender",)] * len(face_imgs))]
@@ -0,0 +1,334 @@
+"""Several cameras on one machine, each read by its own capture process.
+
+    python multicam.py 0 rtsp://10.0.0.5/stream door2.mp4 --names front,back,side
+
+Capture processes write frames into shared-memory ring buffers, so frames
+are never pickled between processes. Detection and tracking run per camera
+in this process and feed one shared inference worker pool. Attendance rows
+are credited to the camera that saw the student first.
+"""
+import os
+import time
+import argparse
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from config import CONFIG
+from pipeline import DropOldQueue, RecognitionPipeline, run_inference
+
+class FrameRing:
+    """Fixed-size frame slots in shared memory, written by a single capture process.
+
+    The header holds the newest sequence number, an ended flag and the
+    sequence number stored in each slot. The writer marks a slot busy (-1),
+    copies the frame in and then publishes its sequence number. Readers get
+    a view of the newest slot and call valid() afterwards to find out whether
+    the writer lapped them meanwhile.
+    """
+
+    def __init__(self, shm, shape, slots):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.header = np.ndarray((2 + slots,), dtype=np.int64, buffer=shm.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=8 * (2 + slots))
+
+    @classmethod
+    def create(cls, shape, slots):
+        size = 8 * (2 + slots) + slots * int(np.prod(shape))
+        ring = cls(shared_memory.SharedMemory(create=True, size=size), shape, slots)
+        ring.header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, shape, slots):
+        return cls(shared_memory.SharedMemory(name=name), shape, slots)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self.header[0])
+
+    @property
+    def ended(self):
+        return bool(self.header[1])
+
+    def mark_ended(self):
+        self.header[1] = 1
+
+    def write(self, frame):
+        seq = self.seq + 1
+        slot = seq % self.slots
+        self.header[2 + slot] = -1
+        self.frames[slot] = frame  # The only copy a frame gets on its way to the workers
+        self.header[2 + slot] = seq
+        self.header[0] = seq
+
+    def view(self, seq):
+        """Frame for seq without copying, or None if its slot holds another frame"""
+        slot = seq % self.slots
+        return self.frames[slot] if self.valid(seq) else None
+
+    def valid(self, seq):
+        return seq > 0 and int(self.header[2 + seq % self.slots]) == seq
+
+    def close(self, unlink=False):
+        self.header = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A view is still referenced somewhere; the mapping goes with the process
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+class RingGrabber:
+    """FrameGrabber interface over a FrameRing, handing out views instead of copies"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.running = False
+
+    @property
+    def ended(self):
+        return self.ring.ended
+
+    def start(self):
+        self.running = True
+        return self
+
+    def wait_next(self, last_seq, timeout=0.05):
+        """Wait for a frame newer than last_seq. Returns (frame view, seq)"""
+        deadline = time.monotonic() + timeout
+        seq = self.ring.seq
+        # The writer is in another process, so poll rather than wait on a condition
+        while seq == last_seq and self.running and not self.ring.ended and time.monotonic() < deadline:
+            time.sleep(0.002)
+            seq = self.ring.seq
+        return self.ring.view(seq), seq
+
+    def valid(self, seq):
+        return self.ring.valid(seq)
+
+    def stop(self):
+        self.running = False
+
+def parse_source(source):
+    """Device indices arrive as strings from the command line"""
+    return int(source) if isinstance(source, str) and source.isdigit() else source
+
+def capture_main(source, handshake, stop_event, slots):
+    """Capture process: read one source into a new ring until stopped or the source ends"""
+    cv2.setNumThreads(1)
+    cap = cv2.VideoCapture(source)
+    ok, frame = cap.read()
+    if not ok:
+        cap.release()
+        handshake.put(None)
+        return
+
+    ring = FrameRing.create(frame.shape, slots)
+    handshake.put((ring.name, frame.shape))
+    # Files would otherwise be read as fast as the disk allows; play them at their own rate
+    interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25.0) if isinstance(source, str) and os.path.exists(source) else 0.0
+    next_time = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            if frame.shape != ring.shape:
+                frame = cv2.resize(frame, (ring.shape[1], ring.shape[0]))
+            ring.write(frame)
+            if interval:
+                next_time += interval
+                time.sleep(max(0.0, next_time - time.monotonic()))
+            ok, frame = cap.read()
+            if not ok:
+                break
+    finally:
+        ring.mark_ended()
+        cap.release()
+        # Keep the mapping alive until the parent is done with it (Windows frees it with the last handle)
+        stop_event.wait()
+        ring.close()  # The parent unlinks
+
+class Camera:
+    """One source with its capture process, ring buffer and recognition pipeline"""
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = parse_source(source)
+        self.process = None
+        self.ring = None
+        self.pipeline = None
+        self.tile = None  # Last tile drawn, reused when the writer laps a read
+
+class MultiCameraPipeline:
+    """Capture process per source -> shared-memory rings -> per-camera tracking -> shared inference pool"""
+
+    def __init__(self, sources, recognizer, log_attendance, analyzer, names=None):
+        names = names or [f"cam{i + 1}" for i in range(len(sources))]
+        self.cameras = [Camera(name, source) for name, source in zip(names, sources)]
+        self.recognizer = recognizer
+        self.log_attendance = log_attendance  # Called as log_attendance(user_id, camera)
+        self.analyzer = analyzer
+        self.context = multiprocessing.get_context("spawn")
+        self.stop_event = self.context.Event()
+        self.running = False
+        self.workers = []
+
+    @property
+    def active(self):
+        return [camera for camera in self.cameras if camera.pipeline is not None]
+
+    @property
+    def ended(self):
+        return all(camera.ring.ended for camera in self.active)
+
+    def start(self):
+        from detection import FaceDetection
+        from tracker import FaceTracker
+
+        slots = CONFIG["camera_ring_slots"]
+        handshakes = []
+        for camera in self.cameras:
+            handshake = self.context.Queue()
+            camera.process = self.context.Process(target=capture_main, daemon=True,
+                                                  args=(camera.source, handshake, self.stop_event, slots))
+            camera.process.start()
+            handshakes.append(handshake)
+
+        self.running = True
+        jobs = DropOldQueue(CONFIG["inference_queue_size"] * len(self.cameras))
+        for camera, handshake in zip(self.cameras, handshakes):
+            try:
+                opened = handshake.get(timeout=CONFIG["camera_open_timeout"])
+            except Exception:
+                opened = None
+            if opened is None:
+                print(f"Could not open camera {camera.name} ({camera.source})")
+                continue
+            camera.ring = FrameRing.attach(opened[0], opened[1], slots)
+            # Detection keeps per-stream state, so each camera gets its own detector and tracker
+            camera.pipeline = RecognitionPipeline(
+                None, FaceDetection(store_ages=False), self.recognizer, FaceTracker(),
+                lambda user_id, camera=camera.name: self.log_attendance(user_id, camera), self.analyzer,
+                grabber=RingGrabber(camera.ring), jobs=jobs, workers=0).start()
+
+        for _ in range(CONFIG["inference_workers"]):
+            worker = threading.Thread(target=run_inference, args=(jobs, lambda: self.running), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return self
+
+    def marked(self):
+        """(camera, user_id) for every user newly logged since the last call"""
+        marked = []
+        for camera in self.active:
+            while not camera.pipeline.marked_users.empty():
+                marked.append((camera.name, camera.pipeline.marked_users.get_nowait()))
+        return marked
+
+    def combined_view(self):
+        """Latest frame of every camera with its overlays, tiled into one image"""
+        width, height = CONFIG["camera_tile_size"]
+        tiles = []
+        for camera in self.active:
+            seq = camera.ring.seq
+            frame = camera.ring.view(seq)
+            if frame is not None:
+                frame = frame.copy()
+                if not camera.ring.valid(seq):
+                    frame = None  # Overwritten while we copied it
+            if frame is not None:
+                for (x, y, w, h), display_text in camera.pipeline.overlays():
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
+                    cv2.putText(frame, display_text, (x, y-10),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
+                camera.tile = cv2.resize(frame, (width, height))
+            if camera.tile is None:
+                tile = np.zeros((height, width, 3), dtype=np.uint8)
+            else:
+                tile = camera.tile.copy()
+            label = camera.name + (" (ended)" if camera.ring.ended else "")
+            cv2.putText(tile, label, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+            tiles.append(tile)
+
+        if not tiles:
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        columns = int(np.ceil(np.sqrt(len(tiles))))
+        tiles += [np.zeros_like(tiles[0])] * (-len(tiles) % columns)
+        return np.vstack([np.hstack(tiles[i:i + columns]) for i in range(0, len(tiles), columns)])
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        for camera in self.active:
+            camera.pipeline.stop()
+        for worker in self.workers:
+            worker.join(timeout=2.0)
+        self.workers = []
+        for camera in self.cameras:
+            if camera.process is not None:
+                camera.process.join(timeout=2.0)
+                if camera.process.is_alive():
+                    camera.process.terminate()
+            if camera.ring is not None:
+                camera.ring.close(unlink=True)
+                camera.ring = None
+            camera.pipeline = None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Take attendance from several cameras or video files at once")
+    parser.add_argument("sources", nargs="*", help="device indices, video files or RTSP URLs "
+                                                   "(default: camera_sources from config)")
+    parser.add_argument("--names", default=None, help="comma-separated camera names for attendance")
+    parser.add_argument("--no-display", action="store_true", help="run without the combined window")
+    args = parser.parse_args(argv)
+
+    from detection import FaceDetection
+    from attendance import AttendanceWriter
+    sources = args.sources or CONFIG["camera_sources"]
+    names = args.names.split(",") if args.names else CONFIG["camera_names"]
+
+    if CONFIG["recognition_server"]:
+        from remote import RemoteRecognizer
+        recognizer = RemoteRecognizer(CONFIG["recognition_server"])
+        detector = FaceDetection(age_stats=recognizer.age_stats)
+        analyzer = recognizer.analyze_attributes
+    else:
+        from recognition import FaceRecognition
+        recognizer = FaceRecognition()
+        detector = FaceDetection()
+        analyzer = detector.analyze_attributes
+    writer = AttendanceWriter(os.path.join(os.path.dirname(__file__), "attendance.csv"), registry=recognizer.registry)
+
+    cameras = MultiCameraPipeline(sources, recognizer, lambda user_id, camera: writer.mark_user(user_id, camera=camera),
+                                  analyzer, names=names).start()
+    try:
+        while not cameras.ended:
+            if args.no_display:
+                time.sleep(0.1)
+            else:
+                cv2.imshow("Cameras", cameras.combined_view())
+                if cv2.waitKey(15) == ord('E'):
+                    break
+            for camera, user_id in cameras.marked():
+                print(f"{recognizer.registry.display_name(user_id)} marked present by {camera}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cameras.stop()
+        writer.close()
+        detector.close()
+        if not args.no_display:
+            cv2.destroyAllWindows()  # Headless OpenCV builds raise here
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
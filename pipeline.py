@@ -0,0 +1,214 @@
+import queue
+import threading
+import time
+from config import CONFIG
+from metrics import metrics
+
+class FrameGrabber:
+    """Reads the camera on its own thread and keeps only the newest frame"""
+
+    def __init__(self, video_cap):
+        self.video_cap = video_cap
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.ended = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            with metrics.timer("capture"):
+                ret, frame = self.video_cap.read()
+            with self.cond:
+                if not ret:
+                    self.ended = True
+                    self.cond.notify_all()
+                    break
+                # Overwrite instead of queueing so a slow consumer never sees stale frames
+                self.frame = frame
+                self.seq += 1
+                self.cond.notify_all()
+            metrics.count("frames_captured")
+
+    def wait_next(self, last_seq, timeout=0.05):
+        """Wait for a frame newer than last_seq. Returns (frame, seq)"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq or self.ended or not self.running, timeout)
+            return self.frame, self.seq
+
+    def valid(self, seq):
+        """Whether the frame returned for seq is still intact; frames here are never overwritten in place"""
+        return True
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+
+class DropOldQueue:
+    """Bounded queue that evicts the oldest item instead of blocking the producer"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, item):
+        """Add item, returning whatever had to be evicted to make room"""
+        evicted = []
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return evicted
+            except queue.Full:
+                try:
+                    evicted.append(self.queue.get_nowait())
+                    self.dropped += 1
+                    metrics.count("jobs_dropped")
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+def run_inference(jobs, is_running):
+    """Worker loop over a job queue, which several pipelines may share"""
+    while is_running():
+        try:
+            pipeline, stale, face_imgs = jobs.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        try:
+            pipeline.process_job(stale, face_imgs)
+        except Exception as e:
+            # Keep the worker alive and hand the tracks back so the next frame re-queues them
+            print(f"Inference error: {e}")
+            metrics.count("inference_errors")
+            with pipeline.lock:
+                for track in stale:
+                    track.pending = False
+
+class RecognitionPipeline:
+    """Capture -> detection/tracking -> inference pool, decoupled from the display loop.
+
+    Cameras sharing one worker pool pass the same `jobs` queue and workers=0,
+    and run run_inference over it themselves.
+    """
+
+    def __init__(self, video_cap, detector, recognizer, tracker, log_attendance, analyzer=None,
+                 grabber=None, jobs=None, workers=None):
+        self.grabber = grabber or FrameGrabber(video_cap)
+        self.detector = detector
+        self.recognizer = recognizer
+        # Attribute analysis runs in the detector unless a thin client routes it elsewhere
+        self.analyzer = analyzer or detector.analyze_attributes
+        self.tracker = tracker
+        self.log_attendance = log_attendance
+        self.jobs = jobs or DropOldQueue(CONFIG["inference_queue_size"])
+        self.workers = CONFIG["inference_workers"] if workers is None else workers
+        self.lock = threading.Lock()
+        self.attendance_lock = threading.Lock()
+        self.marked_users = queue.Queue()  # Newly logged user IDs, for targeted table updates
+        self.tracks = []
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        self.grabber.start()
+        self.threads = [threading.Thread(target=self._detect_loop, daemon=True)]
+        for _ in range(self.workers):
+            self.threads.append(threading.Thread(target=run_inference, args=(self.jobs, lambda: self.running),
+                                                 daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.grabber.stop()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        self.threads = []
+
+    def _detect_loop(self):
+        last_seq = 0
+        while self.running and not self.grabber.ended:
+            frame, seq = self.grabber.wait_next(last_seq)
+            if frame is None or seq == last_seq:
+                continue
+            last_seq = seq
+
+            with metrics.timer("detect"):
+                faces = self.detector.detect_faces(frame)
+            now = time.monotonic()
+            with metrics.timer("track"), self.lock:
+                tracks = self.tracker.update(faces)
+                stale = [t for t in tracks if not t.pending and self.tracker.needs_refresh(t, now)]
+                for track in stale:
+                    track.pending = True
+                self.tracks = tracks
+            metrics.count("frames_detected")
+
+            if stale:
+                face_imgs = [frame[y:y+h, x:x+w].copy() for (x, y, w, h) in (t.box for t in stale)]
+                if not self.grabber.valid(seq):
+                    # The frame was overwritten while we read it; retry these tracks on the next one
+                    with self.lock:
+                        for track in stale:
+                            track.pending = False
+                    continue
+                # Evicted jobs give their tracks back so they are picked up again next frame
+                for owner, old_tracks, _ in self.jobs.put((self, stale, face_imgs)):
+                    with owner.lock:
+                        for track in old_tracks:
+                            track.pending = False
+
+    def process_job(self, stale, face_imgs):
+        """Recognize the crops of one job and update its tracks and attendance"""
+        with metrics.timer("recognize"):
+            user_ids = self.recognizer.recognize_faces(face_imgs)
+        names = [self.recognizer.registry.display_name(user_id) for user_id in user_ids]
+        known = [i for i, user_id in enumerate(user_ids) if user_id != "Unknown"]
+        attributes = []
+        if known:
+            # Cached per identity, so only stale attributes hit the models
+            with metrics.timer("attributes"):
+                attributes = self.analyzer(
+                    [face_imgs[i] for i in known], [names[i] for i in known], actions=("age", "emotion"))
+        metrics.count("inference_jobs")
+        metrics.count("faces_recognized", len(face_imgs))
+
+        now = time.monotonic()
+        with self.lock:
+            for track, user_id, name in zip(stale, user_ids, names):
+                if user_id != track.user_id:
+                    track.attendance_logged = False
+                track.user_id = user_id
+                track.name = name
+                track.last_verified = now
+                track.pending = False
+            for i, values in zip(known, attributes):
+                stale[i].age = values["age"]
+                stale[i].emotion = values["emotion"]
+
+        # Attendance is logged once per track rather than once per frame
+        with metrics.timer("attendance"), self.attendance_lock:
+            for track in stale:
+                if track.is_known and not track.attendance_logged:
+                    if self.log_attendance(track.user_id):
+                        track.attendance_logged = True
+                        self.marked_users.put(track.user_id)
+
+    def overlays(self):
+        """Boxes and labels of the latest known tracks for the display loop"""
+        with self.lock:
+            return [(t.box, f"{t.name}, {t.age}, {t.emotion}") for t in self.tracks if t.is_known]
@@ -1,49 +1,73 @@
-import os
-import cv2
-import json
-from deepface import DeepFace
-from config import CONFIG
-
-class FaceRecognition:
-    def __init__(self):
-        self.roll_numbers_dir = os.path.join(os.path.dirname(__file__), "roll_numbers")
-        os.makedirs(self.roll_numbers_dir, exist_ok=True)
-
-    def register_user(self, name, roll_no, face_img):
-        # Save image (name only)
-        img_path = os.path.join(CONFIG["images_dir"], f"{name}.jpg")
-        cv2.imwrite(img_path, face_img)
-        
-        # Save roll number separately
-        roll_path = os.path.join(self.roll_numbers_dir, f"{name}.txt")
-        with open(roll_path, "w") as f:
-            f.write(roll_no)
-        
-        return True
-
-    def recognize_face(self, face_img):
-        try:
-            matches = DeepFace.find(
-                img_path=face_img,
-                db_path=CONFIG["images_dir"],
-                model_name=CONFIG["model_name"],
-                enforce_detection=False,
-                silent=True
-            )
-
-            if matches and not matches[0].empty:
-                best_match = matches[0].iloc[0]
-                if best_match["distance"] < CONFIG["recognition_threshold"]:
-                    name = os.path.splitext(os.path.basename(best_match["identity"]))[0]
-                    return name
-            return "Unknown"
-        except Exception as e:
-            print(f"Recognition error: {e}")
-            return "Unknown"
-
-    def get_roll_no(self, name):
-        roll_path = os.path.join(self.roll_numbers_dir, f"{name}.txt")
-        if os.path.exists(roll_path):
-            with open(roll_path, "r") as f:
-                return f.read().strip()
-        return "N/A"
\ No newline at end of file
+import os
+import cv2
+from config import CONFIG
+import models
+from gallery import GalleryIndex
+from metadata import UserMetadataCache
+from registry import IdentityRegistry
+
+class FaceRecognition:
+    def __init__(self, sync_gallery=True, read_only=False):
+        # Old per-user roll number files, only read when migrating into the registry
+        self.roll_numbers_dir = os.path.join(os.path.dirname(__file__), "roll_numbers")
+        # Worker processes open the registry read-only; only the parent mints user IDs
+        self.registry = IdentityRegistry(roll_numbers_dir=self.roll_numbers_dir, read_only=read_only)
+        # With sync_gallery=False new images are embedded later by gallery.refresh()
+        self.gallery = GalleryIndex(sync=sync_gallery, sections=self.registry.sections(),
+                                    key_of=self.registry.user_id_for_image)
+        self.metadata = UserMetadataCache()
+        if not read_only:
+            self._forget_deleted()
+        self.ready = models.manager.ready  # Set once the models are loaded
+
+    def register_user(self, name, roll_no, face_img):
+        # Save image (name only)
+        img_path = os.path.join(CONFIG["images_dir"], f"{name}.jpg")
+        cv2.imwrite(img_path, face_img)
+
+        # Identity record with a stable user ID and the roll number
+        record = self.registry.register(name, roll_no, f"{name}.jpg")
+
+        # Update the embedding index for this user only
+        self.gallery.add(record["user_id"], face_img, img_path)
+
+        # Gender and thumbnail are computed once here, not on every table refresh.
+        # A re-registration can keep the old mtime, so drop the old entry first
+        try:
+            self.metadata.forget(img_path)
+            self.metadata.refresh(img_path)
+            self.metadata.save()
+        except Exception as e:
+            print(f"Error caching metadata for {name}: {e}")
+
+        return True
+
+    def _forget_deleted(self):
+        """Drop cached metadata of users whose images were deleted"""
+        for img_path in list(self.metadata.entries):
+            if not os.path.exists(img_path):
+                self.metadata.forget(img_path)
+        self.metadata.save()
+
+    def save_roll_no(self, name, roll_no, persist=True):
+        record = self.registry.by_name(name)
+        image_file = record["image"] if record else f"{name}.jpg"
+        self.registry.register(name, roll_no, image_file, persist=persist)
+
+    def recognize_face(self, face_img):
+        try:
+            return self.gallery.match(face_img)
+        except Exception as e:
+            print(f"Recognition error: {e}")
+            return "Unknown"
+
+    def recognize_faces(self, face_imgs):
+        """User ID for every face crop of one frame, in the same order ("Unknown" if no match)"""
+        try:
+            return self.gallery.match_batch(face_imgs)
+        except Exception as e:
+            print(f"Recognition error: {e}")
+            return ["Unknown"] * len(face_imgs)
+
+    def get_roll_no(self, name):
+        return self.registry.roll_no(name)
@@ -0,0 +1,186 @@
+import os
+import json
+import uuid
+import threading
+from config import CONFIG
+
+class IdentityRegistry:
+    """Every enrolled user under a stable ID, loaded once from a single JSON file.
+
+    A record holds the display name, roll number, image file and an optional
+    class/section. The user ID is also the record's key in GalleryIndex.
+
+    Only one process may mint IDs and write the file. Every other process
+    opens it with read_only=True and re-reads it when it changes on disk.
+    """
+
+    def __init__(self, path=None, images_dir=None, roll_numbers_dir=None, read_only=False):
+        self.path = path or CONFIG["registry_path"]
+        self.images_dir = images_dir or CONFIG["images_dir"]
+        self.roll_numbers_dir = roll_numbers_dir or os.path.join(os.path.dirname(__file__), "roll_numbers")
+        self.read_only = read_only
+        self.records = {}  # user_id -> record
+        self.names = {}  # name -> user_id
+        self.images = {}  # image file -> user_id
+        self.loaded_mtime = None
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        changed = False
+        if os.path.exists(self.path):
+            try:
+                self.loaded_mtime = os.path.getmtime(self.path)
+                with open(self.path, 'r') as f:
+                    for record in json.load(f)["users"]:
+                        # Gallery keys used to be image stems; they are the user ID now
+                        changed |= record.pop("embedding", None) is not None
+                        self._index(record)
+            except Exception as e:
+                print(f"Error loading identity registry: {e}")
+        if self.read_only:
+            return
+        if self.sync_images() or changed:
+            self.save()
+
+    def reload(self):
+        """Re-read the registry, e.g. after another process registered a user"""
+        with self.lock:
+            self.records, self.names, self.images = {}, {}, {}
+            self.load()
+
+    def _reload_if_changed(self):
+        """Read-only registries follow the writer's saves"""
+        if not self.read_only:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self.loaded_mtime:
+            self.reload()
+
+    def sync_images(self):
+        """Migrate images/ and roll_numbers/ into the registry. Returns True if anything changed.
+
+        Images without a record are added with their roll number file, and
+        records whose image has gone are dropped.
+        """
+        if not os.path.exists(self.images_dir):
+            return False
+        on_disk = {f for f in os.listdir(self.images_dir) if f.endswith('.jpg')}
+        changed = False
+        with self.lock:
+            for user_id, record in list(self.records.items()):
+                if record["image"] not in on_disk:
+                    self._unindex(user_id)
+                    changed = True
+            known = {record["image"] for record in self.records.values()}
+            for image_file in sorted(on_disk - known):
+                name = os.path.splitext(image_file)[0]
+                self._index(self._new_record(name, self._legacy_roll_no(name), image_file))
+                changed = True
+        return changed
+
+    def _legacy_roll_no(self, name):
+        roll_path = os.path.join(self.roll_numbers_dir, f"{name}.txt")
+        if os.path.exists(roll_path):
+            with open(roll_path, "r") as f:
+                return f.read().strip()
+        return "N/A"
+
+    @staticmethod
+    def _new_record(name, roll_no, image_file, section=None):
+        return {
+            "user_id": uuid.uuid4().hex[:12],
+            "name": name,
+            "roll_no": roll_no,
+            "image": image_file,
+            "section": section
+        }
+
+    def _index(self, record):
+        self.records[record["user_id"]] = record
+        self.names[record["name"]] = record["user_id"]
+        self.images[record["image"]] = record["user_id"]
+
+    def _unindex(self, user_id):
+        record = self.records.pop(user_id)
+        self.names.pop(record["name"], None)
+        self.images.pop(record["image"], None)
+
+    def save(self):
+        """Write the registry atomically"""
+        if self.read_only:
+            raise RuntimeError("identity registry is open read-only")
+        with self.lock:
+            data = json.dumps({"users": list(self.records.values())}, indent=1)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def register(self, name, roll_no, image_file=None, section=None, persist=True):
+        """Create or update the record for a name, keeping its user ID. Returns the record"""
+        image_file = image_file or f"{name}.jpg"
+        if self.read_only:
+            raise RuntimeError("identity registry is open read-only")
+        with self.lock:
+            user_id = self.names.get(name)
+            if user_id is not None:
+                record = self.records[user_id]
+                self._unindex(user_id)
+                record.update(roll_no=roll_no, image=image_file)
+                if section is not None:
+                    record["section"] = section
+            else:
+                record = self._new_record(name, roll_no, image_file, section)
+            self._index(record)
+        if persist:
+            self.save()
+        return record
+
+    def remove(self, user_id, persist=True):
+        with self.lock:
+            if user_id in self.records:
+                self._unindex(user_id)
+        if persist:
+            self.save()
+
+    def get(self, user_id):
+        if user_id not in self.records:
+            self._reload_if_changed()
+        return self.records.get(user_id)
+
+    def by_name(self, name):
+        if name not in self.names:
+            self._reload_if_changed()
+        user_id = self.names.get(name)
+        return self.records.get(user_id) if user_id else None
+
+    def user_id_for_image(self, image_file):
+        """Gallery key for an image in images_dir, or None if it has no record"""
+        return self.images.get(image_file)
+
+    def display_name(self, user_id):
+        """Name for a recognition result; "Unknown" and keys without a record pass through"""
+        record = self.get(user_id) if user_id != "Unknown" else None
+        return record["name"] if record else user_id
+
+    def roll_no(self, name):
+        record = self.by_name(name)
+        return record["roll_no"] if record else "N/A"
+
+    def sections(self):
+        """User ID -> section, for sharded search"""
+        with self.lock:
+            return {r["user_id"]: r["section"] for r in self.records.values() if r.get("section")}
+
+    def all(self):
+        self._reload_if_changed()
+        with self.lock:
+            return list(self.records.values())
+
+    def __len__(self):
+        return len(self.records)
@@ -0,0 +1,210 @@
+"""Thin client for server.py, and a load generator for trying it with several cameras.
+
+    python remote.py --clients 8 --requests 50 --faces 4
+"""
+import os
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+import numpy as np
+from config import CONFIG
+from metadata import UserMetadataCache
+from registry import IdentityRegistry
+from server import encode_image
+
+def request_json(url, payload=None, timeout=None):
+    """GET (no payload) or POST JSON to the server and return the decoded reply"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout or CONFIG["server_timeout"]) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"server error {e.code}: {e.read().decode('utf-8', 'replace')}") from None
+
+class RemoteAgeStats:
+    """Read-only AgeStatsStore stand-in that asks the server for median ages.
+
+    median() is called from the Tk thread while table rows bind, so it only
+    reads a client-side copy. Every user's age comes in one /ages request
+    on a background thread once the copy is older than `refresh` seconds.
+    Predictions are recorded by the server while it answers /analyze, so
+    add() has nothing to do here.
+    """
+
+    def __init__(self, url, timeout=None, refresh=None):
+        self.url = url
+        self.timeout = timeout
+        self.refresh = CONFIG["server_ages_refresh"] if refresh is None else refresh
+        self.ages = {}
+        self.fetched = None
+        self.fetching = False
+        self.lock = threading.Lock()
+
+    def fetch_async(self):
+        """Start a background fetch unless one is running or the copy is still fresh"""
+        with self.lock:
+            if self.fetching or (self.fetched is not None and time.monotonic() - self.fetched < self.refresh):
+                return
+            self.fetching = True
+        threading.Thread(target=self._fetch, daemon=True).start()
+
+    def _fetch(self):
+        ages = None
+        try:
+            ages = request_json(self.url + "/ages", timeout=self.timeout)["ages"]
+        except Exception as e:
+            print(f"Error fetching ages: {e}")
+        with self.lock:
+            if ages is not None:
+                self.ages = ages
+            self.fetched = time.monotonic()  # Also after a failure, so a down server isn't retried per row
+            self.fetching = False
+
+    def median(self, name):
+        self.fetch_async()
+        with self.lock:
+            return self.ages.get(name)
+
+    def add(self, name, age):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class RemoteRecognizer:
+    """Drop-in for FaceRecognition that sends face crops to a recognition server.
+
+    The server is the only process that mints user IDs and writes the
+    registry, metadata and age stats. The client opens the registry and
+    metadata files read-only and follows the server's saves, and asks the
+    server for median ages.
+    """
+
+    def __init__(self, url=None, timeout=None):
+        self.url = (url or CONFIG["recognition_server"]).rstrip("/")
+        self.timeout = timeout or CONFIG["server_timeout"]
+        self.roll_numbers_dir = os.path.join(os.path.dirname(__file__), "roll_numbers")
+        self.registry = IdentityRegistry(roll_numbers_dir=self.roll_numbers_dir, read_only=True)
+        self.metadata = UserMetadataCache(predict_genders=self.predict_genders, read_only=True)
+        self.age_stats = RemoteAgeStats(self.url, self.timeout)
+        self.ready = threading.Event()  # Set once the server reports its models loaded
+        self.thread = None
+
+    def _request(self, path, payload=None):
+        return request_json(self.url + path, payload, self.timeout)
+
+    def connect(self, interval=0.5):
+        """Poll the server on a daemon thread until its models are ready"""
+        if self.thread is not None:
+            return self.thread
+
+        def run():
+            while not self.ready.is_set():
+                try:
+                    if self._request("/health")["ready"]:
+                        self.age_stats.fetch_async()  # Ages are there by the time the table refreshes
+                        self.ready.set()
+                        return
+                except Exception:
+                    pass  # Server not up yet
+                time.sleep(interval)
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def health(self):
+        return self._request("/health")
+
+    def recognize_face(self, face_img):
+        return self.recognize_faces([face_img])[0]
+
+    def recognize_faces(self, face_imgs):
+        """User ID for every face crop of one frame, in the same order ("Unknown" if no match)"""
+        if len(face_imgs) == 0:
+            return []
+        try:
+            return self._request("/recognize", {"faces": [encode_image(f) for f in face_imgs]})["user_ids"]
+        except Exception as e:
+            print(f"Recognition error: {e}")
+            return ["Unknown"] * len(face_imgs)
+
+    def analyze_attributes(self, face_imgs, user_names=None, actions=("age", "emotion", "gender")):
+        """Same contract as FaceDetection.analyze_attributes, computed on the server"""
+        if len(face_imgs) == 0:
+            return []
+        try:
+            return self._request("/analyze", {"faces": [encode_image(f) for f in face_imgs],
+                                              "names": user_names, "actions": list(actions)})["attributes"]
+        except Exception as e:
+            print(f"Attribute analysis error: {e}")
+            return [{a: "Unknown" for a in actions} for _ in face_imgs]
+
+    def predict_genders(self, face_imgs):
+        return [r["gender"] for r in self.analyze_attributes(face_imgs, actions=("gender",))]
+
+    def register_user(self, name, roll_no, face_img):
+        self._request("/register", {"name": name, "roll_no": roll_no, "face": encode_image(face_img)})
+        # The server wrote the new identity; pick it up for the table
+        self.registry.reload()
+        return True
+
+    def get_roll_no(self, name):
+        return self.registry.roll_no(name)
+
+def simulate(url, clients, requests, faces, seed=0):
+    """Fire recognition requests from several concurrent clients. Returns (latencies, errors)"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(index):
+        rng = np.random.default_rng(seed + index)
+        crops = [rng.integers(0, 256, (96, 96, 3), dtype=np.uint8) for _ in range(faces)]
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                request_json(url.rstrip("/") + "/recognize", {"faces": [encode_image(c) for c in crops]})
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a recognition server with simulated camera clients")
+    parser.add_argument("--url", default=None,
+                        help=f"server URL (default: http://{CONFIG['server_host']}:{CONFIG['server_port']})")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--faces", type=int, default=2, help="face crops per request")
+    args = parser.parse_args(argv)
+
+    url = args.url or CONFIG["recognition_server"] or f"http://{CONFIG['server_host']}:{CONFIG['server_port']}"
+    started = time.perf_counter()
+    latencies, errors = simulate(url, args.clients, args.requests, args.faces)
+    elapsed = time.perf_counter() - started
+    if latencies:
+        p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+        print(f"{len(latencies)} requests in {elapsed:.1f}s ({len(latencies) / elapsed:.1f}/s), "
+              f"latency p50 {p50:.1f}ms p95 {p95:.1f}ms p99 {p99:.1f}ms")
+    if errors:
+        print(f"{len(errors)} failed, first: {errors[0]}")
+    print(f"Server: {request_json(url.rstrip('/') + '/health')['recognize']}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
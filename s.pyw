@@ -1,5 +1,9 @@
-from ui import FaceRecognitionUI
-
-if __name__ == "__main__":
-    app = FaceRecognitionUI()
-    app.run()
\ No newline at end of file
+from ui import FaceRecognitionUI
+
+if __name__ == "__main__":
+    app = FaceRecognitionUI()
+    try:
+        app.run()
+    finally:
+        # Flushes buffered attendance rows before exit
+        app.cleanup()
\ No newline at end of file
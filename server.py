@@ -0,0 +1,288 @@
+"""Local recognition server shared by every camera kiosk on one machine.
+
+    python server.py --port 8765
+    python server.py --stub-models          # no TensorFlow, for trying clients out
+
+The server owns the models, the gallery index, the attribute cache and every
+persisted store (identities, metadata, age stats), so they are loaded once
+however many cameras connect and only one process writes them. Face crops posted by
+clients are pooled into micro-batches: a batch goes to the models as soon
+as it holds server_max_batch crops, or once its oldest request has waited
+server_max_wait seconds. Run the UI as a thin client by setting
+CONFIG["recognition_server"] to the server URL.
+"""
+import json
+import base64
+import time
+import queue
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+from config import CONFIG
+import models
+
+def encode_image(img):
+    ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    if not ok:
+        raise ValueError("image could not be encoded")
+    return base64.b64encode(buffer.tobytes()).decode("ascii")
+
+def decode_image(text):
+    img = cv2.imdecode(np.frombuffer(base64.b64decode(text), dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("image could not be decoded")
+    return img
+
+class _Request:
+    __slots__ = ("items", "done", "results", "error")
+
+    def __init__(self, items):
+        self.items = items
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+class MicroBatcher:
+    """Pools the items of concurrent requests into one call of `process`.
+
+    process takes a flat list of items and returns one result per item. A
+    batch closes when it holds max_batch items or max_wait seconds after its
+    first request arrived, whichever comes first.
+    """
+
+    def __init__(self, process, max_batch=None, max_wait=None):
+        self.process = process
+        self.max_batch = max_batch or CONFIG["server_max_batch"]
+        self.max_wait = CONFIG["server_max_wait"] if max_wait is None else max_wait
+        self.queue = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.items = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, items, timeout=None):
+        """Queue items and block until their results are ready"""
+        if not items:
+            return []
+        request = _Request(list(items))
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("batch did not complete in time")
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _collect(self, first):
+        batch, size = [first], len(first.items)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self.running = False
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _run(self):
+        while self.running:
+            first = self.queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            items = [item for request in batch for item in request.items]
+            try:
+                results = self.process(items)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            start = 0
+            for request in batch:
+                request.results = results[start:start + len(request.items)]
+                start += len(request.items)
+                request.done.set()
+            self.requests += len(batch)
+            self.batches += 1
+            self.items += len(items)
+
+    def stats(self):
+        return {"requests": self.requests, "batches": self.batches, "items": self.items,
+                "mean_batch": self.items / self.batches if self.batches else 0.0}
+
+    def stop(self):
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout=1.0)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients reuse one connection
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        routes = {"/health": self.server.app.health, "/ages": self.server.app.ages}
+        handler = routes.get(self.path)
+        if handler is not None:
+            self._reply(200, handler())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {"/recognize": self.server.app.recognize, "/analyze": self.server.app.analyze,
+                  "/register": self.server.app.register}
+        handler = routes.get(self.path)
+        if handler is None:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, {"error": f"bad request: {e}"})
+            return
+        try:
+            self._reply(200, handler(payload))
+        except (KeyError, ValueError) as e:
+            self._reply(400, {"error": f"bad request: {e}"})
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+
+class RecognitionServer:
+    """HTTP front end over one FaceRecognition and FaceDetection shared by all clients"""
+
+    def __init__(self, host=None, port=None, recognizer=None, detector=None):
+        if recognizer is None:
+            from recognition import FaceRecognition
+            recognizer = FaceRecognition(sync_gallery=False)
+        if detector is None:
+            from detection import FaceDetection
+            detector = FaceDetection()
+        self.recognizer = recognizer
+        self.detector = detector
+        self.register_lock = threading.Lock()
+        self.recognize_batcher = MicroBatcher(self.recognizer.recognize_faces)
+        self.analyze_batcher = MicroBatcher(self._analyze_items)
+        self.httpd = ThreadingHTTPServer((host or CONFIG["server_host"],
+                                          CONFIG["server_port"] if port is None else port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.app = self
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _analyze_items(self, items):
+        """items are (crop, name, actions); one fused pass per distinct action set"""
+        results = [None] * len(items)
+        groups = {}
+        for i, (_, _, actions) in enumerate(items):
+            groups.setdefault(actions, []).append(i)
+        for actions, rows in groups.items():
+            values = self.detector.analyze_attributes([items[i][0] for i in rows],
+                                                      [items[i][1] for i in rows], actions=actions)
+            for i, value in zip(rows, values):
+                results[i] = value
+        return results
+
+    def recognize(self, payload):
+        crops = [decode_image(face) for face in payload["faces"]]
+        return {"user_ids": self.recognize_batcher.submit(crops, CONFIG["server_timeout"])}
+
+    def analyze(self, payload):
+        crops = [decode_image(face) for face in payload["faces"]]
+        names = payload.get("names") or [None] * len(crops)
+        actions = tuple(payload.get("actions") or ("age", "emotion", "gender"))
+        items = [(crop, name, actions) for crop, name in zip(crops, names)]
+        return {"attributes": self.analyze_batcher.submit(items, CONFIG["server_timeout"])}
+
+    def register(self, payload):
+        face_img = decode_image(payload["face"])
+        with self.register_lock:
+            self.recognizer.register_user(payload["name"], payload["roll_no"], face_img)
+        return {"registered": payload["name"]}
+
+    def ages(self):
+        """Median age per user; the server is the only process keeping age stats"""
+        age_stats = self.detector.age_stats
+        return {"ages": age_stats.medians() if age_stats is not None else {}}
+
+    def health(self):
+        return {
+            "ready": models.manager.ready.is_set(),
+            "gallery_size": len(self.recognizer.gallery),
+            "recognize": self.recognize_batcher.stats(),
+            "analyze": self.analyze_batcher.stats()
+        }
+
+    def start(self, warm_up=True):
+        """Serve on a background thread; models load on the warm-up thread meanwhile"""
+        if warm_up:
+            models.manager.warm_up(after_load=self.recognizer.gallery.refresh)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.recognize_batcher.stop()
+        self.analyze_batcher.stop()
+        self.detector.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve face recognition to local camera clients")
+    parser.add_argument("--host", default=None, help=f"bind address (default: {CONFIG['server_host']})")
+    parser.add_argument("--port", type=int, default=None, help=f"port (default: {CONFIG['server_port']})")
+    parser.add_argument("--max-batch", type=int, default=None, help="crops per model call")
+    parser.add_argument("--max-wait", type=float, default=None, help="seconds a request may wait for a batch")
+    parser.add_argument("--stub-models", action="store_true",
+                        help="use the benchmark's stub models with a scratch gallery")
+    args = parser.parse_args(argv)
+
+    if args.max_batch:
+        CONFIG["server_max_batch"] = args.max_batch
+    if args.max_wait is not None:
+        CONFIG["server_max_wait"] = args.max_wait
+    if args.stub_models:
+        # Stub embeddings must never overwrite the real embedding store
+        from bench import install_stub_backend, isolate_storage
+        isolate_storage(tempfile.mkdtemp(prefix="smarta_server_"))
+        install_stub_backend()
+
+    server = RecognitionServer(args.host, args.port).start()
+    print(f"Recognition server listening on {server.address}")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,194 +1,207 @@
-import os
-import tkinter as tk
-from tkinter import ttk
-from PIL import Image, ImageTk
-from config import CONFIG
-import json
-from deepface import DeepFace
-import csv
-from datetime import datetime
-
-class UserTable:
-    def __init__(self, parent_frame, detector, recognizer):
-        self.parent = parent_frame
-        self.detector = detector
-        self.recognizer = recognizer
-        self.create_table()
-
-    def create_table(self):
-        # Main container frame
-        self.table_container = tk.Frame(self.parent)
-        self.table_container.pack(fill=tk.BOTH, expand=True)
-
-        # Canvas and scrollbar
-        self.canvas = tk.Canvas(self.table_container, borderwidth=0, highlightthickness=0)
-        self.scrollbar = ttk.Scrollbar(self.table_container, orient="vertical", command=self.canvas.yview)
-        
-        # Frame that will hold our table
-        self.table_frame = tk.Frame(self.canvas)
-        
-        # Put the table frame in the canvas
-        self.canvas.create_window((0, 0), window=self.table_frame, anchor="nw")
-        
-        # Configure scrolling
-        self.table_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
-            )
-        )
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-    
-        # Pack scrollbar and canvas
-        self.scrollbar.pack(side="right", fill="y")
-        self.canvas.pack(side="left", fill="both", expand=True)
-
-        # Create a container frame inside table_frame
-        self.content_frame = tk.Frame(self.table_frame)
-        self.content_frame.pack(expand=True, pady=10)
-
-        # Create table headers
-        headers = ["Registered Users", "Image", "Roll No.", "Gender", "Attendance", "Predicted Age"]
-        for col, header in enumerate(headers):
-            tk.Label(self.content_frame, text=header, font=("Arial", 12, "bold"), 
-                     borderwidth=1, relief="solid", width=19).grid(row=0, column=col, padx=4, pady=4)
-
-        # Load and display registered users
-        self.display_users()
-
-        # Mousewheel scrolling
-        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
-
-    def _on_mousewheel(self, event):
-        """Handle mousewheel scrolling"""
-        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-
-    def display_users(self):
-        """Display all registered users in the table"""
-        if not os.path.exists(CONFIG["images_dir"]):
-            return
-
-        image_files = [f for f in os.listdir(CONFIG["images_dir"]) if f.endswith('.jpg')]
-        
-        # Configure grid weights
-        for i in range(6):
-            self.content_frame.grid_columnconfigure(i, weight=1)
-
-        # Display each user in table
-        for row, image_file in enumerate(image_files, start=1):
-            name = os.path.splitext(image_file)[0]  # Get name without extension
-            roll_no = self.recognizer.get_roll_no(name)  # Get roll number from separate storage
-            
-            # Name column
-            tk.Label(self.content_frame, text=name, font=("Arial", 10), 
-                     borderwidth=1, relief="solid", padx=1, pady=5).grid(
-                         row=row, column=0, sticky="nsew")
-            
-            # Image column
-            try:
-                img_path = os.path.join(CONFIG["images_dir"], image_file)
-                img = Image.open(img_path)
-                img.thumbnail((60, 60))
-                photo = ImageTk.PhotoImage(img)
-                
-                img_frame = tk.Frame(self.content_frame, borderwidth=1, relief="solid", padx=1, pady=5)
-                img_frame.grid(row=row, column=1, sticky="nsew")
-                img_label = tk.Label(img_frame, image=photo)
-                img_label.image = photo
-                img_label.pack(padx=5, pady=5)
-
-                # Get predicted gender using DeepFace
-                gender = self.predict_gender(img_path)
-            except Exception as e:
-                print(f"Error loading image {image_file}: {e}")
-                img_frame = tk.Frame(self.content_frame, borderwidth=1, relief="solid", padx=1, pady=5)
-                img_frame.grid(row=row, column=1, sticky="nsew")
-                tk.Label(img_frame, text="Image not found").pack(padx=5, pady=5)
-                gender = "Unknown"
-
-            # Roll No. column 
-            tk.Label(self.content_frame, text=roll_no, borderwidth=1, relief="solid", padx=1, pady=5).grid(
-                row=row, column=2, sticky="nsew")
-
-            # Gender column
-            tk.Label(self.content_frame, text=gender, borderwidth=1, relief="solid", padx=1, pady=5).grid(
-                row=row, column=3, sticky="nsew")
-
-            # Attendance column - FIXED: Use the fixed check_attendance method
-            attendance_status = self._check_attendance(name, roll_no)
-            color = "green" if "Present" in attendance_status else "red"
-            tk.Label(self.content_frame, text=attendance_status, fg=color,
-                     borderwidth=1, relief="solid", padx=1, pady=5).grid(
-                         row=row, column=4, sticky="nsew")
-            
-            # Age column
-            age_text = "Not yet predicted"
-            try:
-                age_file = os.path.join(CONFIG["age_dir"], f"{name}.json")
-                if os.path.exists(age_file):
-                    with open(age_file, 'r') as f:
-                        age_data = json.load(f)
-                    if "median_age" in age_data:
-                        age_text = f"{age_data['median_age']} years"
-            except Exception as e:
-                print(f"Error loading age data for {name}: {e}")
-            
-            tk.Label(self.content_frame, text=age_text, 
-                     borderwidth=1, relief="solid", padx=10, pady=5).grid(
-                         row=row, column=5, sticky="nsew")
-    
-    def _check_attendance(self, name, roll_no):
-        """Check if student has attendance marked today"""
-        try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            attendance_path = os.path.join(os.path.dirname(__file__), "attendance.csv")
-            
-            if not os.path.exists(attendance_path):
-                return "Absent ✖"
-
-            with open(attendance_path, 'r') as f:
-                reader = csv.reader(f)
-                next(reader)  # Skip header
-                for row in reader:
-                    if len(row) >= 3:
-                        if (row[0].strip() == name.strip() and 
-                            row[1].strip() == roll_no.strip() and 
-                            row[2].strip() == today):
-                            return "Present ✔"
-            return "Absent ✖"
-        except Exception as e:
-            print(f"Error reading attendance: {e}")
-            return "Error"
-
-    def predict_gender(self, image_path):
-        """Predict gender using DeepFace"""
-        try:
-            analysis = DeepFace.analyze(image_path, actions=['gender'], enforce_detection=False)
-            gender_data = analysis[0]['gender']
-            predicted_gender = max(gender_data, key=gender_data.get)
-            return predicted_gender
-        except Exception as e:
-            print(f"Error predicting gender for {image_path}: {e}")
-            return "Unknown"
-
-    def refresh_table(self):
-        """Refresh the user table to show updated data"""
-        try:
-            if hasattr(self, 'content_frame') and self.content_frame.winfo_exists():
-                for widget in self.content_frame.winfo_children():
-                    widget.destroy()
-                # Recreate headers
-                headers = ["Registered Users", "Image", "Roll No.", "Gender", "Attendance", "Predicted Age"]
-                for col, header in enumerate(headers):
-                    tk.Label(self.content_frame, text=header, font=("Arial", 12, "bold"), 
-                             borderwidth=1, relief="solid", width=19).grid(row=0, column=col, padx=4, pady=4)
-                
-                # Reload and display users
-                self.display_users()
-                
-                # Update the canvas
-                self.canvas.update_idletasks()
-                self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-            
-        except Exception as e:
-            print(f"Error in refresh_table: {e}")
\ No newline at end of file
+import os
+import tkinter as tk
+from tkinter import ttk
+from PIL import ImageTk
+from config import CONFIG
+
+HEADERS = ["Registered Users", "Image", "Roll No.", "Gender", "Attendance", "Predicted Age"]
+COLUMN_WIDTH = 190
+ROW_HEIGHT = 80
+HEADER_HEIGHT = 32
+
+class TableRow:
+    """One row of cells that gets rebound to whichever user scrolls into view"""
+
+    def __init__(self, canvas):
+        self.frame = tk.Frame(canvas, width=COLUMN_WIDTH * len(HEADERS), height=ROW_HEIGHT)
+        self.cells = []
+        for col in range(len(HEADERS)):
+            cell = tk.Label(self.frame, borderwidth=1, relief="solid", padx=10 if col == 5 else 1, pady=5)
+            cell.place(x=col * COLUMN_WIDTH, y=0, width=COLUMN_WIDTH, height=ROW_HEIGHT)
+            self.cells.append(cell)
+        self.cells[0].configure(font=("Arial", 10))
+        self.window_id = canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+        self.index = None  # Row of the data model currently shown
+
+class UserTable:
+    def __init__(self, parent_frame, detector, recognizer, attendance):
+        self.parent = parent_frame
+        self.detector = detector
+        self.recognizer = recognizer
+        self.attendance = attendance
+        self.rows = []  # One dict per registered user
+        self.row_index = {}  # user_id -> position in self.rows
+        self.pool = []  # Recycled TableRow widgets, only enough to fill the view
+        self.create_table()
+
+    def create_table(self):
+        # Main container frame
+        self.table_container = tk.Frame(self.parent)
+        self.table_container.pack(fill=tk.BOTH, expand=True)
+
+        # Headers stay fixed above the scrolling rows
+        self.header_frame = tk.Frame(self.table_container, width=COLUMN_WIDTH * len(HEADERS), height=HEADER_HEIGHT)
+        self.header_frame.pack(side="top", anchor="nw", pady=(10, 0))
+        for col, header in enumerate(HEADERS):
+            tk.Label(self.header_frame, text=header, font=("Arial", 12, "bold"),
+                     borderwidth=1, relief="solid").place(
+                         x=col * COLUMN_WIDTH, y=0, width=COLUMN_WIDTH, height=HEADER_HEIGHT)
+
+        # Canvas and scrollbar
+        body = tk.Frame(self.table_container)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(body, borderwidth=0, highlightthickness=0,
+                                width=COLUMN_WIDTH * len(HEADERS), yscrollincrement=ROW_HEIGHT // 4)
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.canvas.yview)
+
+        # Every scroll or resize re-renders only the rows in view
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.canvas.bind("<Configure>", lambda e: self._render())
+
+        # Pack scrollbar and canvas
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        # Load and display registered users
+        self.display_users()
+
+        # Mousewheel scrolling
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+
+    def _on_mousewheel(self, event):
+        """Handle mousewheel scrolling"""
+        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._render()
+
+    def display_users(self):
+        """Load registered users into the data model and render the visible rows"""
+        present = self._present_today()  # One lookup for the whole table
+        self.rows = []
+        for record in self.recognizer.registry.all():
+            self.rows.append({
+                "user_id": record["user_id"],
+                "name": record["name"],
+                "roll_no": record["roll_no"],
+                "img_path": os.path.join(CONFIG["images_dir"], record["image"]),
+                "attendance": self._check_attendance(record["user_id"], present)
+            })
+        self.row_index = {row["user_id"]: i for i, row in enumerate(self.rows)}
+
+        self.canvas.configure(scrollregion=(0, 0, COLUMN_WIDTH * len(HEADERS), ROW_HEIGHT * len(self.rows)))
+        for table_row in self.pool:
+            table_row.index = None  # Force a rebind against the new data
+        self._render()
+        self.recognizer.metadata.save()
+
+    def _render(self):
+        """Bind pooled row widgets to the users currently inside the viewport"""
+        if not self.canvas.winfo_exists():
+            return
+        height = max(self.canvas.winfo_height(), ROW_HEIGHT)
+        first = max(0, int(self.canvas.canvasy(0) // ROW_HEIGHT))
+        visible = max(0, min(len(self.rows) - first, height // ROW_HEIGHT + 2))
+
+        while len(self.pool) < height // ROW_HEIGHT + 2 and len(self.pool) < len(self.rows):
+            self.pool.append(TableRow(self.canvas))
+
+        # Slot by index modulo pool size, so scrolling one row only rebinds one widget
+        shown = set()
+        for index in range(first, first + visible):
+            table_row = self.pool[index % len(self.pool)]
+            if table_row.index != index:
+                self._bind_row(table_row, index)
+            self.canvas.coords(table_row.window_id, 0, index * ROW_HEIGHT)
+            self.canvas.itemconfigure(table_row.window_id, state="normal")
+            shown.add(id(table_row))
+
+        for table_row in self.pool:
+            if id(table_row) not in shown:
+                table_row.index = None
+                self.canvas.itemconfigure(table_row.window_id, state="hidden")
+
+    def _bind_row(self, table_row, index):
+        user = self.rows[index]
+        name_cell, image_cell, roll_cell, gender_cell, attendance_cell, age_cell = table_row.cells
+
+        name_cell.configure(text=user["name"])
+        roll_cell.configure(text=user["roll_no"])
+
+        # Image column
+        try:
+            photo = ImageTk.PhotoImage(self.recognizer.metadata.thumbnail(user["img_path"]))
+            image_cell.configure(image=photo, text="")
+            image_cell.image = photo
+
+            # Cached gender, predicted only when the image changes
+            gender = self.predict_gender(user["img_path"])
+        except Exception as e:
+            print(f"Error loading image {user['img_path']}: {e}")
+            image_cell.configure(image="", text="Image not found")
+            image_cell.image = None
+            gender = "Unknown"
+        gender_cell.configure(text=gender)
+
+        self._show_attendance(attendance_cell, user["attendance"])
+
+        # Age column
+        age_text = "Not yet predicted"
+        try:
+            median_age = self.detector.median_age(user["name"])
+            if median_age is not None:
+                age_text = f"{median_age} years"
+        except Exception as e:
+            print(f"Error loading age data for {user['name']}: {e}")
+        age_cell.configure(text=age_text)
+
+        table_row.index = index
+
+    @staticmethod
+    def _show_attendance(cell, status):
+        color = "green" if "Present" in status else "red"
+        cell.configure(text=status, fg=color)
+
+    def set_attendance(self, user_id, present=True):
+        """Flip one user's Attendance cell without touching the other rows"""
+        index = self.row_index.get(user_id)
+        if index is None or not self.canvas.winfo_exists():
+            return
+        status = "Present ✔" if present else "Absent ✖"
+        self.rows[index]["attendance"] = status
+        for table_row in self.pool:
+            if table_row.index == index:
+                self._show_attendance(table_row.cells[4], status)
+
+    def _present_today(self):
+        """identity_key of everyone marked present today, or None on error"""
+        try:
+            return self.attendance.present_today()
+        except Exception as e:
+            print(f"Error reading attendance: {e}")
+            return None
+
+    def _check_attendance(self, user_id, present):
+        """Check if student has attendance marked today"""
+        if present is None:
+            return "Error"
+        return "Present ✔" if user_id in present else "Absent ✖"
+
+    def predict_gender(self, image_path):
+        """Predicted gender from the metadata cache"""
+        try:
+            # Never block the UI on a model load; the table refreshes once models are ready
+            gender = self.recognizer.metadata.gender(image_path, predict=self.recognizer.ready.is_set())
+            return gender or "Loading..."
+        except Exception as e:
+            print(f"Error predicting gender for {image_path}: {e}")
+            return "Unknown"
+
+    def refresh_table(self):
+        """Reload the user list and rebind the visible rows, reusing their widgets"""
+        try:
+            if hasattr(self, 'canvas') and self.canvas.winfo_exists():
+                self.display_users()
+        except Exception as e:
+            print(f"Error in refresh_table: {e}")
@@ -0,0 +1,156 @@
+"""IVFIndex and ShardedIndex bookkeeping, recall and persistence.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CONFIG
+from ann import IVFIndex, ShardedIndex
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+def _clustered(count, dim=32, centres=20, seed=0):
+    """Normalized vectors around a few centres, like embeddings of distinct people"""
+    rng = np.random.default_rng(seed)
+    means = rng.standard_normal((centres, dim))
+    return _unit(means[rng.integers(0, centres, count)] + 0.3 * rng.standard_normal((count, dim)))
+
+def _brute_force(names, vectors, queries):
+    distances = 1.0 - queries @ vectors.T
+    return [names[j] for j in np.argmin(distances, axis=1)]
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = _clustered(200)
+        self.names = [f"n{i}" for i in range(200)]
+        self.index = IVFIndex.build(self.names, self.vectors, nlist=8)
+
+    def test_add_new_name(self):
+        self.index.add("new", self.vectors[0])
+        self.assertEqual(len(self.index), 201)
+        self.assertEqual(self.index.pending_changes(), 1)
+        self.assertEqual(self.index.removed, set())
+
+    def test_replace_built_name(self):
+        replacement = _unit(np.random.default_rng(1).standard_normal(32))
+        self.index.add("n5", replacement)
+        self.index.add("n5", replacement)
+        self.assertEqual(len(self.index), 200)
+        self.assertEqual(self.index.pending_changes(), 1)
+        name, distance = self.index.search(replacement[None], nprobe=8)[0]
+        self.assertEqual(name, "n5")
+        self.assertAlmostEqual(distance, 0.0, places=5)
+
+    def test_remove(self):
+        self.index.remove("n5")
+        self.index.remove("missing")
+        self.assertEqual(len(self.index), 199)
+        self.assertEqual(self.index.pending_changes(), 1)
+        self.assertNotEqual(self.index.search(self.vectors[5][None], nprobe=8)[0][0], "n5")
+
+    def test_add_then_remove_new_name_leaves_nothing_pending(self):
+        self.index.add("new", self.vectors[0])
+        self.index.remove("new")
+        self.assertEqual(len(self.index), 200)
+        self.assertEqual(self.index.pending_changes(), 0)
+
+    def test_all_lists_probed_matches_brute_force(self):
+        queries = _unit(self.vectors[:50] + 0.05 * np.random.default_rng(2).standard_normal((50, 32)))
+        found = [name for name, _ in self.index.search(queries, nprobe=8)]
+        self.assertEqual(found, _brute_force(self.names, self.vectors, queries))
+
+    def test_recall_against_brute_force(self):
+        vectors = _clustered(4000, seed=3)
+        names = [f"n{i}" for i in range(len(vectors))]
+        index = IVFIndex.build(names, vectors, nlist=64)
+        queries = _unit(vectors[:300] + 0.05 * np.random.default_rng(4).standard_normal((300, 32)))
+        found = [name for name, _ in index.search(queries, nprobe=8)]
+        expected = _brute_force(names, vectors, queries)
+        recall = np.mean([a == b for a, b in zip(found, expected)])
+        self.assertGreaterEqual(recall, 0.9)
+
+class ShardedIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="smarta_ann_")
+        self.vectors = _clustered(300)
+        self.names = [f"n{i}" for i in range(300)]
+        self.sections = {name: f"class{i % 3}" for i, name in enumerate(self.names)}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_sections_restrict_search(self):
+        index = ShardedIndex.build(self.names, self.vectors, self.sections, nlist=4)
+        name, _ = index.search(self.vectors[1][None], nprobe=4, sections=["class0"])[0]
+        self.assertEqual(self.sections[name], "class0")
+        self.assertEqual(index.search(self.vectors[1][None], nprobe=4)[0][0], "n1")
+
+    def test_move_between_sections(self):
+        index = ShardedIndex.build(self.names, self.vectors, self.sections, nlist=4)
+        index.add("n1", self.vectors[1], "class0")
+        self.assertEqual(len(index), 300)
+        self.assertEqual(index.pending_changes(), 2)  # Tombstone in class1, overflow in class0
+        self.assertEqual(index.search(self.vectors[1][None], nprobe=4, sections=["class0"])[0][0], "n1")
+        self.assertNotEqual(index.search(self.vectors[1][None], nprobe=4, sections=["class1"])[0][0], "n1")
+
+    def test_save_and_load_with_mmap(self):
+        index = ShardedIndex.build(self.names, self.vectors, self.sections, nlist=4)
+        mtimes = {name: float(i) for i, name in enumerate(self.names)}
+        index.save(self.directory, mtimes)
+
+        loaded, built_from = ShardedIndex.load(self.directory, mmap=True)
+        self.assertEqual(built_from, mtimes)
+        self.assertEqual(len(loaded), 300)
+        self.assertIsInstance(loaded.shards["class0"].vectors, np.memmap)
+        queries = self.vectors[:30]
+        self.assertEqual(loaded.search(queries, nprobe=4), index.search(queries, nprobe=4))
+
+    def test_save_drops_shards_of_removed_sections(self):
+        ShardedIndex.build(self.names, self.vectors, self.sections, nlist=4).save(self.directory, {})
+        ShardedIndex.build(self.names, self.vectors, {}, nlist=4).save(self.directory, {})
+        shards = {f.split("_")[1] for f in os.listdir(self.directory) if f.startswith("shard_")}
+        self.assertEqual(shards, {"0"})
+        loaded, _ = ShardedIndex.load(self.directory)
+        self.assertEqual(len(loaded), 300)
+
+    def test_load_without_meta(self):
+        self.assertEqual(ShardedIndex.load(self.directory), (None, None))
+
+class GalleryAnnTest(unittest.TestCase):
+    def setUp(self):
+        from bench import install_stub_backend, isolate_storage
+        self.config = dict(CONFIG)
+        self.directory = tempfile.mkdtemp(prefix="smarta_gallery_")
+        isolate_storage(self.directory)
+        install_stub_backend()
+        CONFIG.update(ann_min_size=50, ann_rebuild_ratio=0.1)
+
+    def tearDown(self):
+        CONFIG.clear()
+        CONFIG.update(self.config)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_live_adds_trigger_rebuild(self):
+        from gallery import GalleryIndex
+        gallery = GalleryIndex(sync=False)
+        rng = np.random.default_rng(0)
+        gallery.add_embeddings([(f"n{i}", rng.standard_normal(128), 0.0) for i in range(100)])
+        built = gallery.ann
+        self.assertIsNotNone(built)
+        for i in range(15):
+            gallery.add(f"new{i}", rng.integers(0, 256, (64, 64, 3), dtype=np.uint8))
+        self.assertIsNot(gallery.ann, built)
+        self.assertLessEqual(gallery.ann.pending_changes(), 0.1 * len(gallery))
+        self.assertEqual(len(gallery.ann), len(gallery))
+
+if __name__ == "__main__":
+    unittest.main()
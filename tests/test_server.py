@@ -0,0 +1,143 @@
+"""MicroBatcher and RecognitionServer on localhost, with the benchmark's stub models.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CONFIG
+import models
+from bench import install_stub_backend, isolate_storage
+from server import MicroBatcher, RecognitionServer
+
+def _face(seed):
+    # Upscaled noise survives JPEG and resizing well enough to be recognized again
+    small = np.random.default_rng(seed).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return np.kron(small, np.ones((12, 12, 1), dtype=np.uint8))
+
+class AttributeDetector:
+    """The part of FaceDetection the server uses, without the Haar cascade"""
+
+    age_stats = None
+
+    def analyze_attributes(self, face_imgs, user_names=None, actions=("age", "emotion", "gender")):
+        return models.analyze_batch(face_imgs, [actions] * len(face_imgs))
+
+    def close(self):
+        pass
+
+class MicroBatcherTest(unittest.TestCase):
+    def test_concurrent_requests_share_batches(self):
+        calls = []
+
+        def process(items):
+            calls.append(len(items))
+            time.sleep(0.01)
+            return [item * 10 for item in items]
+
+        batcher = MicroBatcher(process, max_batch=64, max_wait=0.05)
+        results = {}
+
+        def client(index):
+            results[index] = batcher.submit([index, index + 100], timeout=5.0)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.stop()
+
+        # Every request gets its own results back, in order
+        self.assertEqual(results, {i: [i * 10, (i + 100) * 10] for i in range(8)})
+        self.assertLess(len(calls), 8)
+        self.assertEqual(batcher.stats()["items"], 16)
+
+    def test_batch_closes_at_max_batch(self):
+        calls = []
+        batcher = MicroBatcher(lambda items: calls.append(len(items)) or items, max_batch=3, max_wait=1.0)
+        started = time.monotonic()
+        self.assertEqual(batcher.submit([1, 2, 3], timeout=5.0), [1, 2, 3])
+        batcher.stop()
+        self.assertLess(time.monotonic() - started, 0.5)  # Full batch doesn't wait out max_wait
+
+    def test_errors_reach_every_request(self):
+        def process(items):
+            raise ValueError("model failed")
+
+        batcher = MicroBatcher(process, max_wait=0.0)
+        with self.assertRaises(ValueError):
+            batcher.submit([1], timeout=5.0)
+        batcher.stop()
+
+class RecognitionServerTest(unittest.TestCase):
+    def setUp(self):
+        self.config = dict(CONFIG)
+        self.directory = tempfile.mkdtemp(prefix="smarta_test_")
+        isolate_storage(self.directory)
+        install_stub_backend()
+        from recognition import FaceRecognition
+        self.server = RecognitionServer("127.0.0.1", 0, FaceRecognition(sync_gallery=False),
+                                        AttributeDetector()).start(warm_up=False)
+
+    def tearDown(self):
+        self.server.stop()
+        CONFIG.clear()
+        CONFIG.update(self.config)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_register_then_recognize_over_http(self):
+        from remote import RemoteRecognizer, request_json
+        client = RemoteRecognizer(self.server.address, timeout=5.0)
+        client.connect(interval=0.05).join(timeout=5.0)
+        self.assertTrue(client.ready.is_set())
+
+        client.register_user("ann", "17", _face(1))
+        user_id = client.registry.by_name("ann")["user_id"]
+        self.assertEqual(client.recognize_faces([_face(1)]), [user_id])
+        self.assertEqual(client.registry.display_name(user_id), "ann")
+
+        attributes = client.analyze_attributes([_face(1), _face(2)], ["ann", None], actions=("age", "gender"))
+        self.assertEqual(len(attributes), 2)
+        self.assertEqual(set(attributes[0]), {"age", "gender"})
+
+        health = request_json(self.server.address + "/health")
+        self.assertEqual(health["gallery_size"], 1)
+        self.assertEqual(health["recognize"]["items"], 1)
+        self.assertEqual(request_json(self.server.address + "/ages"), {"ages": {}})
+
+    def test_remote_ages_never_block_the_caller(self):
+        from agestats import AgeStatsStore, MIN_PREDICTIONS
+        from remote import RemoteAgeStats
+        self.server.detector.age_stats = AgeStatsStore()
+        for age in range(20, 20 + MIN_PREDICTIONS):
+            self.server.detector.age_stats.add("ann", age)
+        self.assertIsNotNone(self.server.detector.age_stats.median("ann"))
+
+        ages = RemoteAgeStats(self.server.address, timeout=5.0, refresh=60.0)
+        self.assertIsNone(ages.median("ann"))  # First call only starts the fetch
+        deadline = time.monotonic() + 5.0
+        while ages.median("ann") is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(ages.median("ann"), self.server.detector.age_stats.median("ann"))
+        self.server.detector.age_stats.close()
+
+    def test_concurrent_clients_are_batched(self):
+        from remote import simulate
+        latencies, errors = simulate(self.server.address, clients=6, requests=5, faces=2)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(latencies), 30)
+        stats = self.server.recognize_batcher.stats()
+        self.assertEqual(stats["items"], 60)
+        self.assertLessEqual(stats["batches"], stats["requests"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import time
+from config import CONFIG
+
+def iou(box_a, box_b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+def centroid_distance(box_a, box_b):
+    """Distance between box centres, relative to the size of box_a"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    return (dx * dx + dy * dy) ** 0.5 / max(aw, ah, 1)
+
+class Track:
+    """One face followed across frames, with its cached identity and attributes"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.missed = 0
+        self.user_id = None
+        self.name = None  # Display name of user_id
+        self.age = None
+        self.emotion = None
+        self.last_verified = None
+        self.attendance_logged = False
+        self.pending = False  # Queued for recognition, don't resubmit
+
+    @property
+    def is_known(self):
+        return self.user_id is not None and self.user_id != "Unknown"
+
+class FaceTracker:
+    def __init__(self):
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, boxes):
+        """Match detected boxes to tracks. Returns the tracks in box order"""
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for b, box in enumerate(boxes):
+                overlap = iou(track.box, box)
+                if overlap >= CONFIG["tracker_iou_threshold"]:
+                    pairs.append((1.0 + overlap, t, b))
+                else:
+                    # Fall back to centroids for small or fast-moving faces
+                    distance = centroid_distance(track.box, box)
+                    if distance <= CONFIG["tracker_max_centroid_distance"]:
+                        pairs.append((1.0 - distance, t, b))
+
+        # Greedy assignment, best scoring pairs first
+        matched_tracks, assigned = set(), [None] * len(boxes)
+        for _, t, b in sorted(pairs, reverse=True):
+            if t in matched_tracks or assigned[b] is not None:
+                continue
+            track = self.tracks[t]
+            track.box = boxes[b]
+            track.missed = 0
+            matched_tracks.add(t)
+            assigned[b] = track
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+
+        for b, box in enumerate(boxes):
+            if assigned[b] is None:
+                assigned[b] = Track(self.next_id, box)
+                self.next_id += 1
+                self.tracks.append(assigned[b])
+
+        # Expire tracks that have been out of view for too long
+        self.tracks = [t for t in self.tracks if t.missed <= CONFIG["tracker_max_missed"]]
+        return assigned
+
+    def needs_refresh(self, track, now=None):
+        """True when a track is new or due for re-verification"""
+        if track.last_verified is None:
+            return True
+        now = time.monotonic() if now is None else now
+        return now - track.last_verified >= CONFIG["reverify_interval"]
+
+    def reset(self):
+        self.tracks = []
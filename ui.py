@@ -1,198 +1,301 @@
-import cv2
-import tkinter as tk
-from tkinter import simpledialog, messagebox
-from detection import FaceDetection
-from recognition import FaceRecognition
-from table import UserTable
-from config import CONFIG
-import os
-import csv
-from datetime import datetime
-
-class FaceRecognitionUI:
-    def __init__(self):
-        self.detector = FaceDetection()
-        self.recognizer = FaceRecognition()
-        self.video_cap = cv2.VideoCapture(0)
-        self.root = tk.Tk()
-        self.root.withdraw()
-        self.initialize_attendance_file()
-    
-    def show_login_popup(self):
-        try:
-            popup = tk.Toplevel(self.root)
-            popup.title("Face Recognition System")
-            popup.state('zoomed')
-
-            main_frame = tk.Frame(popup)
-            main_frame.pack(expand=True, fill=tk.BOTH, padx=20, pady=20)
-
-            tk.Label(main_frame, text="Welcome to\nFace Recognition System",
-                    font=("Arial", 14), width=20, height=3).pack(pady=20)
-
-            button_frame = tk.Frame(main_frame)
-            button_frame.pack(pady=10)
-
-            tk.Button(button_frame, text="Register", command=lambda: self.on_register(popup),
-                     bg="green", fg="white", font=("Arial", 14), width=20, height=2).pack(side=tk.LEFT, padx=10)
-            tk.Button(button_frame, text="Login", command=lambda: self.on_login(popup),
-                     bg="blue", fg="white", font=("Arial", 14), width=20, height=2).pack(side=tk.LEFT, padx=10)
-
-            table_container = tk.Frame(main_frame)
-            table_container.pack(fill=tk.BOTH, expand=True, pady=10)
-
-            # Fixed: Pass both detector and recognizer to UserTable
-            self.user_table = UserTable(table_container, self.detector, self.recognizer)
-            popup.mainloop()
-            
-        except tk.TclError as e:
-            print(f"Error showing login popup: {e}")
-            self.root = tk.Tk()
-            self.root.withdraw()
-            self.show_login_popup()
-            
-    def initialize_attendance_file(self):
-        """Ensure attendance file exists with headers"""
-        self.attendance_path = os.path.join(os.path.dirname(__file__), "attendance.csv")
-        if not os.path.exists(self.attendance_path):
-            with open(self.attendance_path, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Name", "Roll No", "Date", "Time", "Status"])
-
-    def _log_attendance(self, recognized_name):
-      try:
-        if recognized_name == "Unknown":
-            return False
-            
-        roll_no = self.recognizer.get_roll_no(recognized_name)
-        
-        with open(self.attendance_path, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                recognized_name.strip(),
-                roll_no.strip(),
-                datetime.now().strftime("%Y-%m-%d"),
-                datetime.now().strftime("%H:%M:%S"),
-                "Present"
-            ])
-        return True
-      except Exception as e:
-        print(f"Attendance logging error: {e}")
-        return False        
-
-    def on_register(self, popup):
-        name = simpledialog.askstring("Register", "Enter your name:")
-        if not name:
-            return
-        roll_no = simpledialog.askstring("Register", "Enter your Roll No:")
-        if not roll_no:
-            return
-
-        popup.destroy()
-        self.register_new_user(name, roll_no)
-
-    def on_login(self, popup):
-        popup.destroy()
-        self.show_camera()
-
-    def register_new_user(self, name, roll_no):
-        while True:
-            ret, frame = self.video_cap.read()
-            if not ret:
-                break
-
-            faces = self.detector.detect_faces(frame)
-            if len(faces) == 0:
-                cv2.putText(frame, "Align face and press SPACE", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            else:
-                (x, y, w, h) = faces[0]
-                face_img = frame[y:y+h, x:x+w]
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
-                cv2.putText(frame, "Press SPACE to capture", (x, y-10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
-
-            cv2.imshow("Register Face", frame)
-
-            key = cv2.waitKey(1)
-            if key == ord(' '):
-                if len(faces) > 0:
-                    face_img = frame[y:y+h, x:x+w]
-                    # Remove redundant save - recognizer.register_user already saves the image
-                    self.recognizer.register_user(name, roll_no, face_img)
-                    messagebox.showinfo("Success", f"{name} registered successfully!")
-                    break
-            elif key == ord('E') or cv2.getWindowProperty("Register Face", cv2.WND_PROP_VISIBLE) < 1:
-                break
-
-        cv2.destroyAllWindows()
-        self.show_login_popup()
-
-    def show_camera(self):
-        attendance_logged = False  # Track if we need to refresh the table
-        while True:
-            ret, frame = self.video_cap.read()
-            if not ret:
-                break
-
-            faces = self.detector.detect_faces(frame)
-            for (x, y, w, h) in faces:
-                face_img = frame[y:y+h, x:x+w]
-                current_name = self.recognizer.recognize_face(face_img) or "Unknown"
-
-                if current_name != "Unknown":
-                     # Log attendance and set flag if successful
-                 if self._log_attendance(current_name):
-                    attendance_logged = True
-                    
-                    # Check if detector has these methods before calling them
-                    age_text = ""
-                    emotion_text = ""
-                    
-                    # Only call if these methods exist in your detector class
-                    if hasattr(self.detector, 'predict_age'):
-                        age = self.detector.predict_age(face_img, current_name)
-                        age_text = f", {age}"
-                    
-                    if hasattr(self.detector, 'predict_emotion'):
-                        emotion = self.detector.predict_emotion(face_img)
-                        emotion_text = f", {emotion}" 
-                    
-                    display_text = f"{current_name}{age_text}{emotion_text}"
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
-                    cv2.putText(frame, display_text, (x, y-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
-
-            cv2.imshow("Face Recognition", frame)
-            
-            # Refresh table periodically if attendance was logged
-            if attendance_logged and hasattr(self, 'user_table'):
-             self.user_table.refresh_table()
-             attendance_logged = False  # Reset flag after refresh
-
-            if cv2.waitKey(1) == ord('E') or cv2.getWindowProperty("Face Recognition", cv2.WND_PROP_VISIBLE) < 1:
-                break
-
-        cv2.destroyAllWindows()
-        if hasattr(self, 'user_table') and hasattr(self.user_table, 'content_frame') and self.user_table.content_frame.winfo_exists():
-            self.user_table.refresh_table()
-        self.show_login_popup()
-
-    def cleanup(self):
-        self.video_cap.release()
-        cv2.destroyAllWindows()
-        if self.root:
-            self.root.destroy()
-
-    def run(self):
-        self.show_login_popup()
-        self.root.mainloop()
-
-if __name__ == "__main__":
-    app = FaceRecognitionUI()
-    try:
-        app.run()
-    except Exception as e:
-        print(f"Application error: {e}")
-    finally:
+import cv2
+import tkinter as tk
+from tkinter import simpledialog, messagebox
+from detection import FaceDetection
+from recognition import FaceRecognition
+from remote import RemoteRecognizer
+from table import UserTable
+from tracker import FaceTracker
+from pipeline import FrameGrabber, RecognitionPipeline
+from multicam import MultiCameraPipeline, parse_source
+from attendance import AttendanceWriter
+from metrics import metrics
+from config import CONFIG
+import models
+import os
+import json
+import time
+from datetime import datetime
+
+class FaceRecognitionUI:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.window_time = None
+        self.startup_reported = False
+        self.warm_up_started = None
+        if CONFIG["recognition_server"]:
+            # Thin client: models, gallery and every persisted store live in server.py
+            self.recognizer = RemoteRecognizer(CONFIG["recognition_server"])
+            self.recognizer.connect()
+            self.detector = FaceDetection(age_stats=self.recognizer.age_stats)
+            self.analyzer = self.recognizer.analyze_attributes
+        else:
+            self.detector = FaceDetection()
+            # Gallery images are embedded on the warm-up thread, not before the window opens
+            self.recognizer = FaceRecognition(sync_gallery=False)
+            self.warm_up_started = time.monotonic()
+            models.manager.warm_up(after_load=self.recognizer.gallery.refresh)
+            self.analyzer = self.detector.analyze_attributes
+        self.tracker = FaceTracker()
+        self.video_cap = cv2.VideoCapture(parse_source(CONFIG["camera_sources"][0]))
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.open_attendance()
+        metrics.start_exporter()
+    
+    def show_login_popup(self):
+        try:
+            popup = tk.Toplevel(self.root)
+            popup.title("Face Recognition System")
+            popup.state('zoomed')
+
+            main_frame = tk.Frame(popup)
+            main_frame.pack(expand=True, fill=tk.BOTH, padx=20, pady=20)
+
+            tk.Label(main_frame, text="Welcome to\nFace Recognition System",
+                    font=("Arial", 14), width=20, height=3).pack(pady=20)
+
+            button_frame = tk.Frame(main_frame)
+            button_frame.pack(pady=10)
+
+            register_button = tk.Button(button_frame, text="Register", command=lambda: self.on_register(popup),
+                     bg="green", fg="white", font=("Arial", 14), width=20, height=2)
+            register_button.pack(side=tk.LEFT, padx=10)
+            login_button = tk.Button(button_frame, text="Login", command=lambda: self.on_login(popup),
+                     bg="blue", fg="white", font=("Arial", 14), width=20, height=2)
+            login_button.pack(side=tk.LEFT, padx=10)
+
+            self.status_label = tk.Label(main_frame, text="", font=("Arial", 11))
+            self.status_label.pack()
+
+            table_container = tk.Frame(main_frame)
+            table_container.pack(fill=tk.BOTH, expand=True, pady=10)
+
+            # Fixed: Pass both detector and recognizer to UserTable
+            self.user_table = UserTable(table_container, self.detector, self.recognizer, self.attendance)
+            self._watch_models(popup, [register_button, login_button])
+
+            if self.window_time is None:
+                popup.update_idletasks()
+                self.window_time = time.monotonic() - self.started
+            popup.mainloop()
+            
+        except tk.TclError as e:
+            print(f"Error showing login popup: {e}")
+            self.root = tk.Tk()
+            self.root.withdraw()
+            self.show_login_popup()
+            
+    def _watch_models(self, popup, buttons):
+        """Show a loading state and keep the buttons disabled until warm-up finishes"""
+        if not popup.winfo_exists():
+            return
+        if not self.recognizer.ready.is_set():
+            for button in buttons:
+                button.configure(state=tk.DISABLED)
+            waiting = "Waiting for recognition server..." if CONFIG["recognition_server"] else "Loading models..."
+            self.status_label.configure(text=waiting, fg="orange")
+            popup.after(200, lambda: self._watch_models(popup, buttons))
+            return
+
+        for button in buttons:
+            button.configure(state=tk.NORMAL)
+        ready_time = models.manager.warm_up_time or time.monotonic() - self.started
+        self.status_label.configure(text=f"Models ready ({ready_time:.1f}s)", fg="green")
+        if not self.startup_reported:
+            self.startup_reported = True
+            self._report_startup()
+            # Fill in genders the table showed as loading
+            self.user_table.refresh_table()
+
+    def _models_ready_s(self):
+        """Seconds from launch until warm-up finished, as timed on the warm-up thread"""
+        if self.warm_up_started is None or models.manager.warm_up_time is None:
+            return time.monotonic() - self.started  # Thin client: the server loads the models
+        return self.warm_up_started - self.started + models.manager.warm_up_time
+
+    def _report_startup(self):
+        """Print startup timings and append them to the startup log"""
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "window_s": round(self.window_time or 0.0, 3),
+            "models_ready_s": round(self._models_ready_s(), 3),
+            "model_load_s": {name: round(t, 3) for name, t in models.manager.load_times.items()}
+        }
+        print(f"Startup: window in {report['window_s']}s, models ready in {report['models_ready_s']}s")
+        try:
+            with open(CONFIG["startup_log"], "a") as f:
+                f.write(json.dumps(report) + "\n")
+        except Exception as e:
+            print(f"Error writing startup log: {e}")
+
+    def open_attendance(self):
+        """Open the SQLite attendance writer; attendance.csv is exported from it on close"""
+        self.attendance_path = os.path.join(os.path.dirname(__file__), "attendance.csv")
+        self.attendance = AttendanceWriter(self.attendance_path, registry=self.recognizer.registry)
+
+    def _log_attendance(self, user_id, camera=None):
+        try:
+            if user_id == "Unknown":
+                return False
+
+            # Duplicates for today are dropped here, before any file I/O
+            return self.attendance.mark_user(user_id, camera=camera)
+        except Exception as e:
+            print(f"Attendance logging error: {e}")
+            return False
+
+    def on_register(self, popup):
+        name = simpledialog.askstring("Register", "Enter your name:")
+        if not name:
+            return
+        roll_no = simpledialog.askstring("Register", "Enter your Roll No:")
+        if not roll_no:
+            return
+
+        popup.destroy()
+        self.register_new_user(name, roll_no)
+
+    def on_login(self, popup):
+        popup.destroy()
+        if len(CONFIG["camera_sources"]) > 1:
+            self.show_cameras()
+        else:
+            self.show_camera()
+
+    def register_new_user(self, name, roll_no):
+        self.detector.reset()  # Boxes and skip counters from the last session belong to old frames
+        grabber = FrameGrabber(self.video_cap).start()
+        last_seq = 0
+        while not grabber.ended:
+            frame, seq = grabber.wait_next(last_seq)
+            if frame is None or seq == last_seq:
+                continue
+            last_seq = seq
+
+            faces = self.detector.detect_faces(frame)
+            if len(faces) == 0:
+                cv2.putText(frame, "Align face and press SPACE", (10, 30), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            else:
+                (x, y, w, h) = faces[0]
+                face_img = frame[y:y+h, x:x+w]
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
+                cv2.putText(frame, "Press SPACE to capture", (x, y-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
+
+            cv2.imshow("Register Face", frame)
+
+            key = cv2.waitKey(1)
+            if key == ord(' '):
+                if len(faces) > 0:
+                    face_img = frame[y:y+h, x:x+w]
+                    # Remove redundant save - recognizer.register_user already saves the image
+                    self.recognizer.register_user(name, roll_no, face_img)
+                    messagebox.showinfo("Success", f"{name} registered successfully!")
+                    break
+            elif key == ord('E') or cv2.getWindowProperty("Register Face", cv2.WND_PROP_VISIBLE) < 1:
+                break
+
+        grabber.stop()
+        cv2.destroyAllWindows()
+        self.show_login_popup()
+
+    def show_camera(self):
+        self.detector.reset()
+        pipeline = RecognitionPipeline(self.video_cap, self.detector, self.recognizer,
+                                       self.tracker, self._log_attendance, self.analyzer).start()
+        try:
+            last_seq = 0
+            while not pipeline.grabber.ended:
+                # Display runs at camera rate, drawing whatever results are ready
+                frame, seq = pipeline.grabber.wait_next(last_seq)
+                if frame is not None and seq != last_seq:
+                    last_seq = seq
+                    with metrics.timer("display"):
+                        frame = frame.copy()
+                        for (x, y, w, h), display_text in pipeline.overlays():
+                            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
+                            cv2.putText(frame, display_text, (x, y-10),
+                                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
+                        if metrics.enabled and CONFIG["metrics_overlay"]:
+                            self._draw_metrics(frame)
+                        cv2.imshow("Face Recognition", frame)
+                    metrics.count("frames_displayed")
+
+                # Flip only the Attendance cells of newly logged users
+                while not pipeline.marked_users.empty():
+                    user_id = pipeline.marked_users.get_nowait()
+                    if hasattr(self, 'user_table'):
+                        with metrics.timer("table_update"):
+                            self.user_table.set_attendance(user_id)
+
+                if cv2.waitKey(1) == ord('E') or cv2.getWindowProperty("Face Recognition", cv2.WND_PROP_VISIBLE) < 1:
+                    break
+        finally:
+            pipeline.stop()
+
+        cv2.destroyAllWindows()
+        self.tracker.reset()
+        if hasattr(self, 'user_table') and self.user_table.canvas.winfo_exists():
+            self.user_table.refresh_table()
+        self.show_login_popup()
+
+    def show_cameras(self):
+        """Combined view over every configured source, each read by its own capture process"""
+        self.video_cap.release()  # The capture processes open the devices themselves
+        cameras = MultiCameraPipeline(CONFIG["camera_sources"], self.recognizer, self._log_attendance,
+                                      self.analyzer, names=CONFIG["camera_names"]).start()
+        try:
+            while not cameras.ended:
+                with metrics.timer("display"):
+                    view = cameras.combined_view()
+                    if metrics.enabled and CONFIG["metrics_overlay"]:
+                        self._draw_metrics(view)
+                    cv2.imshow("Face Recognition", view)
+                metrics.count("frames_displayed")
+
+                for _, user_id in cameras.marked():
+                    if hasattr(self, 'user_table'):
+                        with metrics.timer("table_update"):
+                            self.user_table.set_attendance(user_id)
+
+                if cv2.waitKey(15) == ord('E') or cv2.getWindowProperty("Face Recognition", cv2.WND_PROP_VISIBLE) < 1:
+                    break
+        finally:
+            cameras.stop()
+
+        cv2.destroyAllWindows()
+        self.video_cap = cv2.VideoCapture(parse_source(CONFIG["camera_sources"][0]))
+        if hasattr(self, 'user_table') and self.user_table.canvas.winfo_exists():
+            self.user_table.refresh_table()
+        self.show_login_popup()
+
+    def _draw_metrics(self, frame):
+        height = frame.shape[0]
+        lines = metrics.overlay_lines()
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (10, height - 10 - 18 * (len(lines) - 1 - i)),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 0), 1)
+
+    def cleanup(self):
+        metrics.stop_exporter()
+        self.attendance.close()
+        self.detector.close()
+        self.video_cap.release()
+        cv2.destroyAllWindows()
+        if self.root:
+            self.root.destroy()
+
+    def run(self):
+        self.show_login_popup()
+        self.root.mainloop()
+
+if __name__ == "__main__":
+    app = FaceRecognitionUI()
+    try:
+        app.run()
+    except Exception as e:
+        print(f"Application error: {e}")
+    finally:
         app.cleanup()
\ No newline at end of file